@@ -1,12 +1,25 @@
 # api_articles.py
 from flask import Blueprint, request, jsonify
 import os, json, datetime, re
+import metrics
+from article_manifest import ArticleManifest
+from article_index import ArticleWordIndex
+from article_segments import ArticleSegmentStore
+from article_profile import build_profile, coverage, profile_version
+from cache import refresh_caches, get_ecdict, get_ecdict_version, get_user_words, get_cache_generation
 
 articles_bp = Blueprint("articles", __name__, url_prefix="/api/articles")
 
 ARTICLES_DIR = os.path.join("data", "articles")
 os.makedirs(ARTICLES_DIR, exist_ok=True)
 
+# segments（預設）：壓縮後 append 到 data/articles/segments/；files：舊版每篇一個 JSON 檔
+ARTICLE_STORAGE = os.environ.get("ARTICLE_STORAGE", "segments")
+
+SEGMENTS = ArticleSegmentStore(ARTICLES_DIR)
+MANIFEST = ArticleManifest(ARTICLES_DIR)
+WORD_INDEX = ArticleWordIndex(ARTICLES_DIR)
+
 
 # --------------------------------------------------------
 # Internal Function（可給 API 與 n8n callback 使用）
@@ -16,7 +29,8 @@ def save_article_internal(title, text, source="manual"):
     核心文章儲存邏輯：
     - 產生 safe title
     - 產生 timestamp
-    - 儲存 JSON
+    - 儲存文章（segment 或 JSON 檔，filename 仍作為文章的 key）
+    - 更新文章清單索引與單字反向索引（含字彙 profile，供清單顯示生字覆蓋率）
     - 回傳 filename 與 metadata
     """
 
@@ -47,8 +61,17 @@ def save_article_internal(title, text, source="manual"):
         "created_at": timestamp
     }
 
-    with open(full_path, "w", encoding="utf-8") as f:
-        json.dump(payload, f, ensure_ascii=False, indent=2)
+    if ARTICLE_STORAGE == "files":
+        with open(full_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, indent=2)
+            f.flush()
+            metrics.record_io("article", "write", os.fstat(f.fileno()).st_size)
+    else:
+        full_path, _ = SEGMENTS.append(filename, payload)
+
+    refresh_caches()
+    MANIFEST.add_article(filename, payload)
+    WORD_INDEX.add_article(filename, text, build_profile(text, get_ecdict()), profile_version(get_ecdict_version()))
 
     return {
         "filename": filename,
@@ -59,6 +82,61 @@ def save_article_internal(title, text, source="manual"):
     }
 
 
+def _read_article(filename):
+    """先查 segment 索引（直接 seek 到該篇）；尚未轉換的文章讀取原本的 JSON 檔，不存在時回傳 None"""
+    article = SEGMENTS.load(filename)
+    if article is not None:
+        return article
+    path = os.path.join(ARTICLES_DIR, filename)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+# --------------------------------------------------------
+# 生字覆蓋率（文章清單使用）
+# --------------------------------------------------------
+_COVERAGE = {}            # filename -> coverage 結果
+_COVERAGE_KEY = None      # (字典版本, 字彙庫版本)；改變時整份失效
+
+
+def attach_coverage(entries):
+    """為清單項目加上 "vocab"（生字數與覆蓋率）；回傳新的 list，不修改清單索引中的 entry
+
+    profile 於儲存文章時產生；字典版本或 profile 格式改變（或舊文章沒有 profile）時在此重新計算並寫回。
+    """
+    global _COVERAGE, _COVERAGE_KEY
+    refresh_caches()
+    dict_version = profile_version(get_ecdict_version())
+    key = (dict_version, get_cache_generation())
+    if key != _COVERAGE_KEY:
+        _COVERAGE, _COVERAGE_KEY = {}, key
+
+    results = _COVERAGE
+    missing = [e["filename"] for e in entries if e["filename"] not in results]
+    if missing:
+        profiles = WORD_INDEX.get_profiles(missing, dict_version)
+        stale = {}
+        for filename in missing:
+            if filename in profiles:
+                continue
+            try:
+                article = _read_article(filename)
+            except Exception:
+                article = None
+            if article is not None:
+                profiles[filename] = stale[filename] = build_profile(article.get("text", ""), get_ecdict())
+        if stale:
+            WORD_INDEX.set_profiles(stale, dict_version)
+
+        user_words = get_user_words()
+        for filename, profile in profiles.items():
+            results[filename] = coverage(profile, user_words)
+
+    return [{**e, "vocab": results.get(e["filename"])} for e in entries]
+
+
 # --------------------------------------------------------
 # 原本 API Route（改為呼叫 internal function）
 # --------------------------------------------------------
@@ -81,28 +159,62 @@ def save_article():
 # --------------------------------------------------------
 @articles_bp.route("/list", methods=["GET"])
 def list_articles():
-    articles = []
-    if not os.path.exists(ARTICLES_DIR):
-        return jsonify([])
-
-    for fname in sorted(os.listdir(ARTICLES_DIR), reverse=True):
-        if not fname.endswith(".json"):
-            continue
-        path = os.path.join(ARTICLES_DIR, fname)
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                item = json.load(f)
-                articles.append({
-                    "filename": fname,
-                    "title": item.get("title", "untitled"),
-                    "source": item.get("source", "manual"),
-                    "created_at": item.get("created_at", "unknown"),
-                    "length": len(item.get("text", "")),
-                })
-        except Exception:
-            continue
-
-    return jsonify(articles)
+    """
+    由文章清單索引回傳，由新到舊排序。
+    可選參數：limit、cursor、source、from / to（YYYY-MM-DD）
+    還有下一頁時，以 X-Next-Cursor header 回傳下一頁的 cursor。
+
+    每篇附上 "vocab"：{"unique", "known", "unknown", "coverage"}（相對於目前的字彙庫）；
+    預設只在分頁（帶 limit）時計算，?coverage=1 / 0 可強制開啟或關閉。
+    """
+    try:
+        limit = int(request.args["limit"]) if "limit" in request.args else None
+    except ValueError:
+        return jsonify({"error": "invalid limit"}), 400
+
+    articles, next_cursor = MANIFEST.query(
+        limit=limit,
+        cursor=request.args.get("cursor"),
+        source=request.args.get("source"),
+        date_from=request.args.get("from"),
+        date_to=request.args.get("to"),
+    )
+
+    with_coverage = request.args.get("coverage", "1" if limit else "0") != "0"
+    if with_coverage:
+        articles = attach_coverage(articles)
+
+    resp = jsonify(articles)
+    if next_cursor:
+        resp.headers["X-Next-Cursor"] = next_cursor
+    return resp
+
+
+# --------------------------------------------------------
+# 查詢包含指定單字的文章（挑選複習用的閱讀素材）
+# --------------------------------------------------------
+@articles_bp.route("/search", methods=["GET"])
+def search_articles():
+    """
+    ?word=a&word=b 或 ?words=a,b，可選 limit（預設 20）
+    依命中單字數與 tf-idf 分數排序
+    """
+    words = request.args.getlist("word")
+    for value in request.args.getlist("words"):
+        words.extend(value.split(","))
+    if not any(w.strip() for w in words):
+        return jsonify({"error": "missing word"}), 400
+
+    try:
+        limit = min(int(request.args.get("limit", 20)), 200)
+    except ValueError:
+        return jsonify({"error": "invalid limit"}), 400
+
+    results = []
+    for hit in WORD_INDEX.search(words, limit=limit):
+        meta = MANIFEST.get(hit["filename"]) or {"filename": hit["filename"]}
+        results.append({**meta, **hit})
+    return jsonify(results)
 
 
 # --------------------------------------------------------
@@ -111,14 +223,11 @@ def list_articles():
 @articles_bp.route("/load/<filename>", methods=["GET"])
 def load_article(filename):
     safe_filename = re.sub(r"[^A-Za-z0-9_.-]+", "", filename)
-    path = os.path.join(ARTICLES_DIR, safe_filename)
-
-    if not os.path.exists(path):
-        return jsonify({"error": "file not found"}), 404
 
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            article = json.load(f)
-        return jsonify(article)
+        article = _read_article(safe_filename)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+    if article is None:
+        return jsonify({"error": "file not found"}), 404
+    return jsonify(article)
@@ -1,131 +1,357 @@
-from flask import Blueprint, jsonify, request, send_file
-import json, csv, io, os
-from cache import WORDS_FILE, refresh_caches
+from flask import Blueprint, Response, jsonify, request
+import json, csv, io, os, zlib, codecs, uuid
+from cache import get_word_store, get_words_version
+from http_cache import cached_response, collect_limited, is_not_modified, not_modified_response, make_etag
+from n8n_dispatcher import SqliteJobStore
+from word_store import WORD_FIELDS, normalize_item
 
 api_import_export_bp = Blueprint("import_export", __name__, url_prefix="/api")
 
 # --------------------------------------------------------
-# 匯出字彙庫
+# 匯出字彙庫（串流輸出，記憶體用量與字彙庫大小無關）
 # --------------------------------------------------------
+EXPORT_BATCH_ROWS = 500
+
+EXPORT_FORMATS = {
+    # format: (mimetype, 下載檔名；None 表示直接回傳)
+    "json": ("application/json", None),
+    "csv": ("text/csv", "words.csv"),
+    "ndjson": ("application/x-ndjson", "words.ndjson"),
+}
+
+
+def _iter_json(rows):
+    yield "["
+    sep = ""
+    for row in rows:
+        yield sep + json.dumps(row, ensure_ascii=False)
+        sep = ",\n"
+    yield "]\n"
+
+
+def _iter_ndjson(rows):
+    batch = []
+    for row in rows:
+        batch.append(json.dumps(row, ensure_ascii=False))
+        if len(batch) >= EXPORT_BATCH_ROWS:
+            yield "\n".join(batch) + "\n"
+            batch = []
+    if batch:
+        yield "\n".join(batch) + "\n"
+
+
+def _iter_csv(rows):
+    # 保留 BOM，讓 Excel 正確辨識 UTF-8
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=WORD_FIELDS, extrasaction="ignore")
+    buf.write("\ufeff")
+    writer.writeheader()
+    for i, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if i % EXPORT_BATCH_ROWS == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate(0)
+    yield buf.getvalue()
+
+
+def _encode(chunks):
+    for chunk in chunks:
+        if chunk:
+            yield chunk.encode("utf-8")
+
+
+def _gzip(chunks):
+    """串流 gzip：每個 chunk 壓縮後立即送出，不需先組出完整內容"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
 @api_import_export_bp.route("/export", methods=["GET"])
 def export_words():
-    fmt = request.args.get("format", "json")
+    """
+    format = json（預設）/ csv / ndjson
+    用戶端 Accept-Encoding 含 gzip（或 br）時回傳壓縮內容（?gzip=0 可關閉）
 
-    if not os.path.exists(WORDS_FILE):
-        return jsonify({"error": "no data"}), 404
+    支援 If-None-Match；匯出內容與壓縮結果快取到字彙庫下次寫入為止，
+    超過 RESPONSE_CACHE_MAX_MB 的匯出不快取，改以串流輸出。
+    """
+    fmt = request.args.get("format", "json")
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": f"unsupported format: {fmt}"}), 400
 
-    with open(WORDS_FILE, "r", encoding="utf-8") as f:
-        words = json.load(f)
+    store = get_word_store()
+    version = get_words_version()
+    key = f"export-{fmt}"
+    compress = request.args.get("gzip") != "0"
+    if is_not_modified(key, version):
+        return not_modified_response(key, version)
 
-    if not words:
+    if not store.count_words():
         return jsonify({"error": "empty"}), 404
 
-    if fmt == "csv":
-        output = io.StringIO()
-        writer = csv.DictWriter(output, fieldnames=words[0].keys())
-        writer.writeheader()
-        writer.writerows(words)
-        mem = io.BytesIO(output.getvalue().encode("utf-8-sig"))
-        mem.seek(0)
-        return send_file(
-            mem,
-            as_attachment=True,
-            download_name="words.csv",
-            mimetype="text/csv",
-        )
+    serializer = {"json": _iter_json, "csv": _iter_csv, "ndjson": _iter_ndjson}[fmt]
+    mimetype, download_name = EXPORT_FORMATS[fmt]
+    headers = {}
+    if download_name:
+        headers["Content-Disposition"] = f"attachment; filename={download_name}"
+
+    response = cached_response(
+        key, version,
+        lambda: collect_limited(_encode(serializer(store.iter_words(EXPORT_BATCH_ROWS)))),
+        mimetype, headers=headers, compress=compress,
+    )
+    if response is not None:
+        return response
+
+    # 超過快取上限：串流輸出（gzip 壓縮結果同樣由版本號決定，可沿用 ETag）
+    body = _encode(serializer(store.iter_words(EXPORT_BATCH_ROWS)))
+    headers["Vary"] = "Accept-Encoding"
+    encoding = None
+    # 與 http_cache.choose_encoding 相同的協商（gzip;q=0 表示不接受）；串流只支援 gzip
+    if compress and request.accept_encodings["gzip"]:
+        body = _gzip(body)
+        headers["Content-Encoding"] = encoding = "gzip"
+    headers["ETag"] = f'"{make_etag(key, version, encoding)}"'
+    headers["Cache-Control"] = "no-cache"
 
-    return jsonify(words)
+    return Response(body, mimetype=mimetype, headers=headers)
 
 
 # --------------------------------------------------------
-# 匯入字彙庫（加強防呆 + 正確 HTTP 狀態碼）
+# 匯入字彙庫（串流解析 + 分批寫入，加強防呆 + 正確 HTTP 狀態碼）
 # --------------------------------------------------------
+IMPORT_CHUNK_SIZE = 64 * 1024
+IMPORT_BATCH_SIZE = 1000
+IMPORT_PROGRESS_LIMIT = 100
+IMPORT_PROGRESS_TTL = 24 * 3600
+
+# 匯入進度存於 SQLite（與 jobs.db 相同），匯入與查詢落在不同 worker 也能看到
+IMPORTS_DB_FILE = os.path.join("data", "imports.db")
+os.makedirs(os.path.dirname(IMPORTS_DB_FILE), exist_ok=True)
+_IMPORT_PROGRESS = SqliteJobStore(IMPORTS_DB_FILE, ttl=IMPORT_PROGRESS_TTL, max_jobs=IMPORT_PROGRESS_LIMIT)
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+def _read_text_chunks(stream):
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    while True:
+        chunk = stream.read(IMPORT_CHUNK_SIZE)
+        text = decoder.decode(chunk, final=not chunk)
+        if text:
+            yield text
+        if not chunk:
+            return
+
+
+def _read_json_array(stream):
+    """逐一產生 JSON list 內的元素，不需把整個 list 載入記憶體"""
+    decoder = json.JSONDecoder()
+    chunks = _read_text_chunks(stream)
+    buf, pos = "", 0
+
+    def read_more():
+        nonlocal buf, pos
+        chunk = next(chunks, None)
+        if chunk is None:
+            return False
+        buf, pos = buf[pos:] + chunk, 0
+        return True
+
+    def skip(chars):
+        nonlocal pos
+        while pos < len(buf) and buf[pos] in chars:
+            pos += 1
+
+    while True:
+        skip(" \t\r\n")
+        if pos < len(buf):
+            break
+        if not read_more():
+            return  # 空內容
+    if buf[pos] != "[":
+        raise ImportFormatError("JSON 必須是 list 格式")
+    pos += 1
+
+    # expect：first（緊接在 [ 之後）、value（, 之後）、sep（元素之後，只接受一個 , 或 ]）
+    expect = "first"
+    while True:
+        skip(" \t\r\n")
+        if pos >= len(buf):
+            if not read_more():
+                raise ImportFormatError("JSON 未正確結束")
+            continue
+        c = buf[pos]
+        if expect == "sep":
+            if c == "]":
+                return
+            if c != ",":
+                raise ImportFormatError(f"JSON list 的元素之間必須以 , 分隔，遇到 {c!r}")
+            pos += 1
+            expect = "value"
+            continue
+        if c == "]":
+            if expect == "first":
+                return
+            raise ImportFormatError("JSON list 的 ] 之前多了 ,")
+        if c == ",":
+            raise ImportFormatError("JSON list 中有多餘的 ,")
+
+        try:
+            item, end = decoder.raw_decode(buf, pos)
+        except ValueError:
+            if read_more():
+                continue
+            raise
+        # 元素後方需緊接 , 或 ]；否則可能是被截斷的數字，讀入下一段後重新解析
+        after = end
+        while after < len(buf) and buf[after] in " \t\r\n":
+            after += 1
+        if (after == len(buf) or buf[after] not in ",]") and read_more():
+            continue
+        yield item
+        pos = end
+        expect = "sep"
+
+
+def _read_ndjson(stream):
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    for lineno, line in enumerate(text, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            raise ImportFormatError(f"第 {lineno} 行不是有效的 JSON: {e}")
+
+
+def _read_csv(stream):
+    yield from csv.DictReader(io.TextIOWrapper(stream, encoding="utf-8-sig", newline=""))
+
+
+def _detect_source():
+    """依 Content-Type / 上傳檔名決定 (reader, stream)"""
+    content_type = request.content_type or ""
+    if "application/json" in content_type:
+        return _read_json_array, request.stream
+    if "ndjson" in content_type or "jsonl" in content_type:
+        return _read_ndjson, request.stream
+    if "file" in request.files:
+        file = request.files["file"]
+        fmt = request.args.get("format") or request.form.get("format")
+        if not fmt:
+            name = (file.filename or "").lower()
+            fmt = "ndjson" if name.endswith((".ndjson", ".jsonl")) else \
+                  "json" if name.endswith(".json") else "csv"
+        reader = {"json": _read_json_array, "ndjson": _read_ndjson, "csv": _read_csv}.get(fmt)
+        if reader is None:
+            raise ImportFormatError(f"unsupported format: {fmt}")
+        return reader, file.stream
+    return None, None
+
+
+def _set_progress(import_id, progress):
+    _IMPORT_PROGRESS.set(import_id, dict(progress))
+
+
+def _partial_detail(progress):
+    committed = progress["added"] + progress["updated"]
+    if not committed:
+        return "字彙庫未變更"
+    return (f"失敗前已寫入的 {committed} 筆（added {progress['added']}、updated {progress['updated']}）"
+            f"已保留在字彙庫中，未寫入的部分可修正後重新匯入")
+
+
 @api_import_export_bp.route("/import", methods=["POST"])
 def import_words():
     """
     支援：
       - JSON (application/json)
-      - CSV (multipart/form-data)
+      - NDJSON (application/x-ndjson)
+      - CSV / JSON / NDJSON 上傳檔 (multipart/form-data，依 ?format= 或副檔名判斷)
     驗證：
       - 必須包含 "word" 欄位
       - 若全錯或無資料 → 回傳 422
+    以 IMPORT_BATCH_SIZE 筆為一批寫入；可帶 ?import_id= 並以
+    GET /api/import/<import_id>/progress 查詢長時間匯入的進度。
+    中途解析或寫入失敗時，先前已寫入的批次（回應中的 added / updated）會保留，不會回滾。
     """
-    try:
-        if os.path.exists(WORDS_FILE):
-            with open(WORDS_FILE, "r", encoding="utf-8") as f:
-                data = json.load(f)
-        else:
-            data = []
-    except Exception as e:
-        return jsonify({"error": f"failed to read local words.json: {str(e)}"}), 500
+    import_id = request.args.get("import_id") or str(uuid.uuid4())
+    progress = {"status": "running", "processed": 0, "added": 0, "updated": 0, "skipped": 0}
+    store = get_word_store()
+    required_field = "word"
+    batch = []
 
-    existing = {w["word"]: w for w in data}
-    new_entries, updated, skipped = 0, 0, 0
-    incoming = []
+    def commit_batch():
+        added, updated = store.merge_words(batch)
+        progress["added"] += added
+        progress["updated"] += updated
+        batch.clear()
+        _set_progress(import_id, progress)
 
-    # === 檔案解析階段 ===
+    # === 解析 + 結構驗證 + 分批寫入 ===
     try:
-        data = request.content_type
-        print(data)
-        if request.content_type and "application/json" in request.content_type:
-            incoming = request.json
-            print(incoming)
-            if not isinstance(incoming, list):
-                return jsonify({"error": "JSON 必須是 list 格式"}), 400
-        elif "file" in request.files:
-            file = request.files["file"]
-            incoming = list(csv.DictReader(io.StringIO(file.read().decode("utf-8"))))
-        else:
+        reader, stream = _detect_source()
+        if reader is None:
             return jsonify({"error": "不支援的內容格式"}), 400
-    except Exception as e:
-        return jsonify({"error": f"解析失敗: {str(e)}"}), 400
+        _set_progress(import_id, progress)
 
-    if not incoming:
-        return jsonify({"error": "匯入檔案為空"}), 422
+        for item in reader(stream):
+            progress["processed"] += 1
+            if not isinstance(item, dict):
+                progress["skipped"] += 1
+                continue
 
-    # === 結構驗證 ===
-    required_field = "word"
-    valid_fields = {"word", "definition", "reviewed", "count"}
-    valid_items = []
+            word = str(item.get(required_field, "") or "").strip()
+            if not word:
+                progress["skipped"] += 1
+                continue
 
-    for idx, item in enumerate(incoming, 1):
-        if not isinstance(item, dict):
-            skipped += 1
-            continue
+            batch.append(normalize_item(item))
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                commit_batch()
 
-        word = str(item.get(required_field, "")).strip()
-        if not word:
-            skipped += 1
-            continue
+        if batch:
+            commit_batch()
+    except (ImportFormatError, ValueError, UnicodeDecodeError, csv.Error) as e:
+        progress["status"] = "failed"
+        _set_progress(import_id, progress)
+        return jsonify({"error": f"解析失敗: {str(e)}", "import_id": import_id,
+                        "detail": _partial_detail(progress), **progress}), 400
+    except Exception as e:
+        progress["status"] = "failed"
+        _set_progress(import_id, progress)
+        return jsonify({"error": f"寫入失敗: {str(e)}", "import_id": import_id,
+                        "detail": _partial_detail(progress), **progress}), 500
 
-        filtered = {k: item[k] for k in item if k in valid_fields}
-        valid_items.append(filtered)
+    progress["status"] = "done"
+    _set_progress(import_id, progress)
 
-    if len(valid_items) == 0:
-        return jsonify({"error": "未找到任何有效字彙", "skipped": skipped}), 422
+    if progress["processed"] == 0:
+        return jsonify({"error": "匯入檔案為空"}), 422
+    if progress["added"] + progress["updated"] == 0:
+        return jsonify({"error": "未找到任何有效字彙", "skipped": progress["skipped"]}), 422
 
-    # === 寫入階段 ===
-    try:
-        for item in valid_items:
-            word = item["word"]
-            if word in existing:
-                existing[word].update(item)
-                updated += 1
-            else:
-                existing[word] = item
-                new_entries += 1
-
-        with open(WORDS_FILE, "w", encoding="utf-8") as f:
-            json.dump(list(existing.values()), f, indent=2, ensure_ascii=False)
-
-        refresh_caches()
-
-        return jsonify({
-            "status": "ok",
-            "added": new_entries,
-            "updated": updated,
-            "skipped": skipped
-        }), 200
+    return jsonify({
+        "status": "ok",
+        "import_id": import_id,
+        "added": progress["added"],
+        "updated": progress["updated"],
+        "skipped": progress["skipped"]
+    }), 200
 
-    except Exception as e:
-        return jsonify({"error": f"寫入失敗: {str(e)}"}), 500
+
+@api_import_export_bp.route("/import/<import_id>/progress", methods=["GET"])
+def import_progress(import_id):
+    progress = _IMPORT_PROGRESS.get(import_id)
+    if progress is None:
+        return jsonify({"error": "import not found"}), 404
+    return jsonify({"import_id": import_id, **progress})
@@ -0,0 +1,81 @@
+# api_lookup.py
+from flask import Blueprint, request, jsonify
+
+from cache import refresh_caches, get_ecdict, get_user_words, get_lookup_indexes
+from word_lookup import MAX_DISTANCE, exact, prefix_search, fuzzy_search
+
+lookup_bp = Blueprint("lookup", __name__, url_prefix="/api")
+
+LOOKUP_MODES = ("auto", "exact", "prefix", "fuzzy")
+LOOKUP_LIMIT_MAX = 50
+
+
+# ============================================================
+# 單字查詢（type-ahead）
+# ============================================================
+@lookup_bp.route("/lookup", methods=["GET"])
+def lookup():
+    """
+    q       ：查詢字串
+    mode    ：auto（預設：完全比對 + 前綴，不足 limit 筆時補上模糊比對）/ exact / prefix / fuzzy
+    limit   ：回傳筆數（預設 10，最多 50）
+    distance：模糊比對的編輯距離上限（預設 2，最多 2）
+
+    回傳 [{"word", "definition", "source": "user" | "ecdict", "match": "exact" | "prefix" | "fuzzy", "distance"}]
+    distance 為編輯距離（前綴比對為 null）。
+    同一單字以使用者字彙的翻譯優先；同一類比對中使用者字彙排在 ECDICT 之前。
+    """
+    q = (request.args.get("q") or request.args.get("word") or "").strip().lower()
+    mode = request.args.get("mode", "auto")
+    if not q:
+        return jsonify({"error": "missing q"}), 400
+    if mode not in LOOKUP_MODES:
+        return jsonify({"error": f"unknown mode: {mode}"}), 400
+    try:
+        limit = min(max(int(request.args.get("limit", 10)), 1), LOOKUP_LIMIT_MAX)
+        distance = min(max(int(request.args.get("distance", MAX_DISTANCE)), 0), MAX_DISTANCE)
+    except ValueError:
+        return jsonify({"error": "invalid limit or distance"}), 400
+
+    refresh_caches()
+    ec, user = get_ecdict(), get_user_words()
+    ec_index, user_index = get_lookup_indexes()
+    sources = (("user", user_index, user), ("ecdict", ec_index, ec))
+
+    results, seen = [], set()
+
+    def add(word, source, definitions, match, dist):
+        if word in seen or len(results) >= limit:
+            return
+        seen.add(word)
+        # 使用者字彙有此單字時，以使用者的翻譯為準
+        if word in user and user[word]:
+            source, definitions = "user", user
+        results.append({
+            "word": word,
+            "definition": definitions.get(word, ""),
+            "source": source,
+            "match": match,
+            "distance": dist,
+        })
+
+    if mode in ("auto", "exact", "prefix"):
+        for source, index, definitions in sources:
+            if exact(index, q):
+                add(q, source, definitions, "exact", 0)
+
+    if mode in ("auto", "prefix"):
+        for source, index, definitions in sources:
+            # 多取一些，扣掉重複後仍能補滿
+            for word in prefix_search(index, q, limit + len(seen)):
+                add(word, source, definitions, "prefix", None)
+
+    if mode == "fuzzy" or (mode == "auto" and len(results) < limit):
+        matches = []
+        for rank, (source, index, definitions) in enumerate(sources):
+            for dist, word in fuzzy_search(index, q, distance, limit + len(seen)):
+                matches.append((dist, rank, word, source, definitions))
+        for dist, _, word, source, definitions in sorted(matches, key=lambda m: m[:3]):
+            add(word, source, definitions, "fuzzy", dist)
+
+    return jsonify(results)
@@ -1,27 +1,84 @@
 # api_parse.py
 from flask import Blueprint, request, jsonify
 import re, json  #  補上 json
+import os
+import threading
+import metrics
+from concurrent.futures import ProcessPoolExecutor
+from ecdict_bin import EcdictReader
+from parse_cache import ParseCache
 from cache import (
     refresh_caches,
     get_ecdict,
     get_user_words,
     load_json_file,
     SEEN_WORDS_FILE,   #  補上 SEEN_WORDS_FILE
-    update_seen_words_internal
+    update_seen_words_internal,
+    get_cache_generation,
+    get_known_words,
 )
 
 
 parse_bp = Blueprint("parse", __name__, url_prefix="/api")
 
+# 批次解析：文章數達 PARSE_POOL_MIN 且字典為 ecdict.bin 時，分散到 process pool
+# （各 worker 以 mmap 開啟同一份 ecdict.bin，共用 page cache）
+PARSE_WORKERS = int(os.environ.get("PARSE_WORKERS", os.cpu_count() or 1))
+PARSE_POOL_MIN = 8
+PARSE_BATCH_LIMIT = 1000
+
+# 解析結果快取（MB），同一篇文章重複送來時直接回傳
+PARSE_CACHE_MB = float(os.environ.get("PARSE_CACHE_MB", 32))
+PARSE_CACHE = ParseCache(PARSE_CACHE_MB)
+
+TOKEN_RE = re.compile(r"[A-Za-z']+")
+PARSE_MODES = ("all", "unknown")
+STOPWORDS = frozenset({"the","a","an","is","are","was","were","to","of","in","on","for","and","with"})
+
+
+def tokenize(text):
+    """文章斷詞：小寫化、去除停用詞，保留重複（文章索引需要詞頻）"""
+    return [w for w in TOKEN_RE.findall(text.lower()) if w not in STOPWORDS]
+
+
+def _parse_mode(payload):
+    mode = request.args.get("mode") or payload.get("mode") or "all"
+    return mode if mode in PARSE_MODES else None
+
+
+def unknown_only(words):
+    """
+    只保留生字與尚未熟悉的單字（reviewed < KNOWN_MIN_REVIEWED），加上 "status"：
+    new（不在字彙庫）/ weak（在字彙庫但尚未熟悉）
+    已熟悉單字的 frozenset 隨字彙庫異動更新，每個單字只需一次 set 查詢。
+    """
+    known, user_words = get_known_words(), get_user_words()
+    return [
+        {**item, "status": "weak" if item["word"] in user_words else "new"}
+        for item in words if item["word"] not in known
+    ]
+
+
 @parse_bp.route("/parse", methods=["POST"])
 def parse_article():
+    """
+    {"text": "...", "mode": "all" | "unknown"}（mode 也可用 ?mode= 指定）
+    mode=unknown 時只回傳生字與尚未熟悉的單字
+    """
     refresh_caches()
-    text = request.json.get("text", "")
-    words = re.findall(r"[A-Za-z']+", text.lower())
+    payload = request.json or {}
+    text = payload.get("text", "")
+    mode = _parse_mode(payload)
+    if mode is None:
+        return jsonify({"error": "unsupported mode"}), 400
+
+    key, generation = ParseCache.key(text), get_cache_generation()
+    cached = PARSE_CACHE.get(key, generation)
+    if cached is not None:
+        update_seen_words_internal([item["word"] for item in cached])
+        return jsonify(unknown_only(cached) if mode == "unknown" else cached)
 
-    stopwords = {"the","a","an","is","are","was","were","to","of","in","on","for","and","with"}
-    filtered = [w for w in words if w not in stopwords]
-    unique_words = sorted(set(filtered))
+    unique_words = sorted(set(tokenize(text)))
 
     EC_CACHE = get_ecdict()
     USER_CACHE = get_user_words()
@@ -43,4 +100,130 @@ def parse_article():
         zh = USER_CACHE.get(w) or EC_CACHE.get(w, "")
         result.append({"word": w, "zh": zh})
 
-    return jsonify(result)
+    PARSE_CACHE.put(key, generation, result)
+    return jsonify(unknown_only(result) if mode == "unknown" else result)
+
+
+@parse_bp.route("/parse/cache", methods=["GET"])
+def parse_cache_stats():
+    """解析結果快取的命中統計"""
+    return jsonify(PARSE_CACHE.stats())
+
+
+@metrics.register_collector
+def _parse_cache_metrics():
+    stats = PARSE_CACHE.stats()
+    return [
+        ("parse_cache_requests_total", "counter", "Parse cache lookups",
+         [({"result": "hit"}, stats["hits"]), ({"result": "miss"}, stats["misses"])]),
+        ("parse_cache_entries", "gauge", "Cached parse results", [({}, stats["entries"])]),
+        ("parse_cache_bytes", "gauge", "Estimated parse cache size", [({}, stats["bytes"])]),
+    ]
+
+
+# ============================================================
+# 批次解析
+# ============================================================
+_POOL = None
+_POOL_KEY = None
+_POOL_LOCK = threading.Lock()
+_WORKER_EC = {}
+
+
+def _init_worker(ecdict_path):
+    global _WORKER_EC
+    _WORKER_EC = EcdictReader(ecdict_path)
+
+
+def _parse_texts(texts, ec=None):
+    """斷詞 + ECDICT 查詢；回傳每篇文章的 [(word, zh), ...]（在 worker process 中執行）"""
+    ec = _WORKER_EC if ec is None else ec
+    return [
+        [(w, ec.get(w, "")) for w in sorted(set(tokenize(text)))]
+        for text in texts
+    ]
+
+
+def _get_pool(ec):
+    """字典換版（ecdict.bin 重新 mmap）時重建 pool，讓 worker 重新開啟新檔"""
+    global _POOL, _POOL_KEY
+    key = (ec.path, id(ec))
+    with _POOL_LOCK:
+        if _POOL_KEY != key:
+            if _POOL is not None:
+                _POOL.shutdown(wait=False)
+            _POOL = ProcessPoolExecutor(
+                max_workers=PARSE_WORKERS, initializer=_init_worker, initargs=(ec.path,)
+            )
+            _POOL_KEY = key
+        return _POOL
+
+
+def parse_texts(texts):
+    ec = get_ecdict()
+    if PARSE_WORKERS <= 1 or len(texts) < PARSE_POOL_MIN or not isinstance(ec, EcdictReader):
+        return _parse_texts(texts, ec)
+
+    pool = _get_pool(ec)
+    size = max(1, -(-len(texts) // (PARSE_WORKERS * 4)))
+    chunks = [texts[i:i + size] for i in range(0, len(texts), size)]
+    parsed = []
+    for part in pool.map(_parse_texts, chunks):
+        parsed.extend(part)
+    return parsed
+
+
+@parse_bp.route("/parse/batch", methods=["POST"])
+def parse_batch():
+    """
+    一次解析多篇文章：
+      {"texts": ["...", "..."]} 或 {"articles": [{"id": "a1", "text": "..."}, ...]}
+    回傳每篇的結果與合併後的不重複單字表；seen_words 每批只更新一次。
+    "mode": "unknown"（或 ?mode=unknown）時只回傳生字與尚未熟悉的單字。
+    """
+    refresh_caches()
+    payload = request.json or {}
+    mode = _parse_mode(payload)
+    if mode is None:
+        return jsonify({"error": "unsupported mode"}), 400
+    if "articles" in payload:
+        articles = [a for a in payload["articles"] if isinstance(a, dict)]
+        ids = [a.get("id", i) for i, a in enumerate(articles)]
+        texts = [str(a.get("text") or "") for a in articles]
+    else:
+        texts = [str(t or "") for t in payload.get("texts", [])]
+        ids = list(range(len(texts)))
+
+    if not texts:
+        return jsonify({"error": "missing texts"}), 400
+    if len(texts) > PARSE_BATCH_LIMIT:
+        return jsonify({"error": f"too many texts (max {PARSE_BATCH_LIMIT})"}), 413
+
+    USER_CACHE = get_user_words()
+    generation = get_cache_generation()
+    keys = [ParseCache.key(t) for t in texts]
+    words_by_text = [PARSE_CACHE.get(k, generation) for k in keys]
+
+    # 只有未命中快取的文章送去解析
+    missing = [i for i, words in enumerate(words_by_text) if words is None]
+    parsed = parse_texts([texts[i] for i in missing]) if missing else []
+    for i, pairs in zip(missing, parsed):
+        words = [{"word": w, "zh": USER_CACHE.get(w) or ec_zh} for w, ec_zh in pairs]
+        PARSE_CACHE.put(keys[i], generation, words)
+        words_by_text[i] = words
+
+    results, merged, seen_words = [], {}, []
+    for article_id, words in zip(ids, words_by_text):
+        seen_words.extend(item["word"] for item in words)
+        if mode == "unknown":
+            words = unknown_only(words)
+        for item in words:
+            merged[item["word"]] = item
+        results.append({"id": article_id, "words": words})
+
+    update_seen_words_internal(seen_words)
+
+    return jsonify({
+        "results": results,
+        "words": [merged[w] for w in sorted(merged)],
+    })
@@ -1,7 +1,8 @@
-from flask import Blueprint, Flask, request, jsonify
-import requests
+from flask import Blueprint, Flask, Response, request, jsonify
+import json, os, queue
 from api_articles import save_article_internal
 from cache import update_seen_words_internal, get_setting_file
+from n8n_dispatcher import SqliteJobStore, N8nDispatcher, TERMINAL_STATUS
 import uuid
 
 
@@ -14,18 +15,26 @@ N8N_WEBHOOK_URL = get_setting_file()
 
 trigger_bp = Blueprint("n8n_trigger", __name__, url_prefix="/api")
 
-job_results = {}
+# job 狀態保留 JOB_TTL 秒、最多 JOB_LIMIT 筆；存於 SQLite，所有 worker 共用
+JOBS_DB_FILE = os.path.join("data", "jobs.db")
+JOB_TTL = 3600
+JOB_LIMIT = 10000
+JOB_WAIT_MAX = 60   # long-poll / SSE 最長等待秒數
 
-# flask -> n8n
+os.makedirs(os.path.dirname(JOBS_DB_FILE), exist_ok=True)
+job_results = SqliteJobStore(JOBS_DB_FILE, ttl=JOB_TTL, max_jobs=JOB_LIMIT)
+dispatcher = N8nDispatcher(N8N_WEBHOOK_URL, job_results)
+
+# flask -> n8n（放入背景佇列，由 dispatcher 以連線池送出並自動重試）
 @trigger_bp.route("/trigger", methods=["POST"])
 def trigger_n8n_workflow():
     job_id = str(uuid.uuid4())
     payload = {"job_id": job_id}
     try:
-        r = requests.post(N8N_WEBHOOK_URL, json=payload, timeout=10)
+        dispatcher.submit(job_id, payload)
         return jsonify({"status": "ok", "job_id": job_id})
-    except Exception as e:
-        return jsonify({"status": "error", "detail": str(e)})
+    except queue.Full:
+        return jsonify({"status": "error", "detail": "dispatch queue full"}), 503
 
 # n8n -> flask
 @trigger_bp.route("/n8n_callback", methods=["POST"])
@@ -61,11 +70,11 @@ def n8n_callback():
         })
     
     # 回存 job 結果
-    job_results[job_id] = {
+    job_results.set(job_id, {
         "status": "done",
         "article": article,
         "words": normalized
-    }
+    })
     
     print(normalized)
     return {"status": "ok"}
@@ -73,4 +82,38 @@ def n8n_callback():
 # fn -> flask
 @trigger_bp.route("/job/<job_id>")
 def get_job(job_id):
-    return job_results.get(job_id, {"status": "pending"})
+    """
+    查詢 job 狀態：
+      - 預設立即回傳
+      - ?wait=N：long-poll，最多等待 N 秒，job 完成（或狀態改變）時立即回傳
+      - Accept: text/event-stream 或 ?stream=1：以 Server-Sent Events 推送每次狀態變化
+    """
+    try:
+        wait = min(float(request.args.get("wait", 0)), JOB_WAIT_MAX)
+    except ValueError:
+        return jsonify({"error": "invalid wait"}), 400
+
+    if request.args.get("stream") == "1" or "text/event-stream" in request.headers.get("Accept", ""):
+        return Response(_job_events(job_id), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    data = job_results.get(job_id)
+    status = data.get("status", "pending") if data else "pending"
+    if wait > 0 and status not in TERMINAL_STATUS:
+        _, data = job_results.wait_for_change(job_id, last_status=status, timeout=wait)
+    return data or {"status": "pending"}
+
+
+def _job_events(job_id):
+    last_status = None
+    waited = 0
+    while waited < JOB_WAIT_MAX:
+        status, data = job_results.wait_for_change(job_id, last_status=last_status, timeout=15)
+        if status == last_status:
+            waited += 15
+            yield ": keep-alive\n\n"
+            continue
+        last_status = status
+        yield f"event: status\ndata: {json.dumps(data or {'status': status}, ensure_ascii=False)}\n\n"
+        if status in TERMINAL_STATUS:
+            return
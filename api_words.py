@@ -1,42 +1,121 @@
-from flask import Blueprint, request, jsonify
-import json
-import random
+from flask import Blueprint, request, jsonify, current_app
+import hashlib
+import time
 
 from cache import (
-    load_json_file,
     update_seen_words_internal,
-    WORDS_FILE,
-    SEEN_WORDS_FILE,
+    get_word_store,
+    get_seen_words,
+    get_word_sampler,
+    get_word_stats,
+    get_seen_counter,
     refresh_caches,
+    get_words_version,
+    get_word_index,
 )
+from http_cache import cached_response, is_not_modified, not_modified_response, with_etag
+from word_query import SORT_FIELDS, RANGE_FIELDS, format_cursor, parse_cursor
+from word_store import WORD_FIELDS
 
 words_bp = Blueprint("words", __name__, url_prefix="/api")
 
 
 # ============================================================
-# 工具函式（統一寫回）
+# CRUD — 單字查詢 / 新增 / 更新 / 刪除
 # ============================================================
-def write_words_file(words: list):
-    """以統一方式寫回 word list，避免舊 save_json_file 造成錯誤。"""
-    with open(WORDS_FILE, "w", encoding="utf-8") as fp:
-        json.dump(words, fp, ensure_ascii=False, indent=2)
-    refresh_caches()
+WORDS_PAGE_DEFAULT = 50
+WORDS_PAGE_MAX = 500
+PAGE_PARAMS = ("limit", "cursor", "sort", "order", "fields", "prefix", "added_by") + tuple(
+    f"{field}_{bound}" for field in RANGE_FIELDS for bound in ("min", "max")
+)
 
 
-# ============================================================
-# CRUD — 單字查詢 / 新增 / 更新 / 刪除
-# ============================================================
 @words_bp.route("/words", methods=["GET"])
 def get_words():
+    """
+    不帶參數時回傳整份字彙庫（相容舊版）；支援 If-None-Match（字彙庫沒有異動時回 304），
+    回應內容與壓縮結果快取到下次寫入為止。
+
+    帶任一分頁參數時改為分頁查詢：
+    limit                  ：每頁筆數（預設 50，最多 500）
+    cursor                 ：上一頁回應的 X-Next-Cursor
+    sort / order           ：word（預設）/ count / reviewed / added_at；asc（預設）/ desc
+    fields                 ：只回傳指定欄位，以逗號分隔（word 一律回傳）
+    prefix                 ：word 前綴
+    added_by               ：來源
+    count_min / count_max / reviewed_min / reviewed_max：範圍（含端點）
+    還有下一頁時，以 X-Next-Cursor header 回傳下一頁的 cursor。
+    """
     refresh_caches()
-    return jsonify(load_json_file(WORDS_FILE))
+    # 版本號要在讀取資料之前取得：讀取期間有寫入時，下次請求會因版本號不同而重新產生
+    version = get_words_version()
+
+    if not any(p in request.args for p in PAGE_PARAMS):
+        def build():
+            return (current_app.json.dumps(get_word_store().list_words()) + "\n").encode("utf-8")
+
+        response = cached_response("words", version, build, "application/json")
+        if response is None:
+            # 字彙庫超過快取上限：不快取，直接序列化
+            response = with_etag(jsonify(get_word_store().list_words()), "words", version)
+        return response
+
+    args = request.args
+    sort = args.get("sort", "word")
+    order = args.get("order", "asc")
+    if sort not in SORT_FIELDS:
+        return jsonify({"error": f"unsupported sort: {sort}"}), 400
+    if order not in ("asc", "desc"):
+        return jsonify({"error": f"unsupported order: {order}"}), 400
+
+    fields = None
+    if args.get("fields"):
+        fields = {f.strip() for f in args["fields"].split(",") if f.strip()} | {"word"}
+        unknown = fields - set(WORD_FIELDS)
+        if unknown:
+            return jsonify({"error": f"unknown fields: {', '.join(sorted(unknown))}"}), 400
+
+    try:
+        limit = min(max(int(args.get("limit", WORDS_PAGE_DEFAULT)), 1), WORDS_PAGE_MAX)
+        cursor = parse_cursor(sort, args["cursor"]) if args.get("cursor") else None
+        ranges = {
+            field: tuple(
+                int(args[f"{field}_{bound}"]) if args.get(f"{field}_{bound}") else None
+                for bound in ("min", "max")
+            )
+            for field in RANGE_FIELDS
+        }
+    except ValueError:
+        return jsonify({"error": "invalid limit, cursor or range"}), 400
+
+    # 每組查詢參數各有自己的 ETag
+    key = "words-" + hashlib.blake2b(request.query_string, digest_size=8).hexdigest()
+    if is_not_modified(key, version):
+        return not_modified_response(key, version)
+
+    rows, next_cursor = get_word_index().query(
+        sort=sort,
+        desc=order == "desc",
+        limit=limit,
+        cursor=cursor,
+        prefix=(args.get("prefix") or "").strip().lower() or None,
+        added_by=args.get("added_by"),
+        ranges=ranges,
+    )
+    if fields:
+        rows = [{k: v for k, v in row.items() if k in fields} for row in rows]
+
+    resp = jsonify(rows)
+    if next_cursor is not None:
+        resp.headers["X-Next-Cursor"] = format_cursor(sort, next_cursor)
+    return with_etag(resp, key, version)
 
 
 @words_bp.route("/words", methods=["POST"])
 def add_or_update_word():
     """統一後端單字存取行為：
     1. 更新 seen_words.json
-    2. 寫入 words.json
+    2. 寫入字彙庫（word store 單筆 upsert）
     """
     payload = request.json or {}
     word = (payload.get("word") or "").strip().lower()
@@ -49,64 +128,83 @@ def add_or_update_word():
     # Step 1 — 更新 seen_words.json
     update_seen_words_internal({word: definition})
 
-    # Step 2 — 更新 words.json
-    words = load_json_file(WORDS_FILE)
-    existing = next((w for w in words if w["word"] == word), None)
-
-    if existing:
-        if definition:
-            existing["definition"] = definition
-        existing["count"] = existing.get("count", 0) + 1
-        status = "updated"
-        count = existing["count"]
-    else:
-        words.append({
-            "word": word,
-            "definition": definition,
-            "reviewed": 0,
-            "count": 1,
-            "added_by": added_by,
-        })
-        status = "created"
-        count = 1
-
-    write_words_file(words)
-    return jsonify({"status": status, "count": count})
+    # Step 2 — 更新字彙庫
+    status, row = get_word_store().add_word(word, definition, added_by)
+    return jsonify({"status": status, "count": row["count"]})
 
 
 @words_bp.route("/words/<word>", methods=["DELETE"])
 def delete_word(word):
-    words = [w for w in load_json_file(WORDS_FILE) if w["word"] != word]
-    write_words_file(words)
+    get_word_store().delete_word(word)
     return jsonify({"status": "deleted"})
 
 
 # ============================================================
-# Review — 記憶評分（保持原功能）
+# Review — 記憶評分 + 間隔重複排程（SM-2）
 # ============================================================
+@words_bp.route("/review/next", methods=["GET"])
+def review_next():
+    """取得目前到期的複習單字（依到期時間排序），?n= 指定數量（預設 20）"""
+    try:
+        n = min(max(int(request.args.get("n", 20)), 1), 500)
+    except ValueError:
+        return jsonify({"error": "invalid n"}), 400
+
+    try:
+        words = get_word_store().due_words(time.time(), limit=n)
+    except NotImplementedError:
+        return jsonify({"error": "review schedule requires the sqlite word store"}), 501
+    return jsonify(words)
+
+
 @words_bp.route("/review/<word>", methods=["POST"])
 def review_word(word):
-    remembered = request.json.get("remembered", False)
-    words = load_json_file(WORDS_FILE)
-
-    for w in words:
-        if w["word"] == word:
-            w["reviewed"] = w.get("reviewed", 0) + (1 if remembered else 0)
-            write_words_file(words)
-            return jsonify({"word": word, "reviewed": w["reviewed"]})
+    """
+    remembered：是否記得（reviewed +1）
+    quality   ：可選，0–5 的自評分數；未提供時依 remembered 換算
+    """
+    payload = request.json or {}
+    remembered = payload.get("remembered", False)
+    quality = payload.get("quality")
+    if quality is not None:
+        try:
+            quality = int(quality)
+        except (TypeError, ValueError):
+            return jsonify({"error": "invalid quality"}), 400
+
+    row = get_word_store().review_word(word, remembered, quality=quality)
+    if row:
+        result = {"word": word, "reviewed": row["reviewed"]}
+        if "due_at" in row:
+            result.update({"due_at": row["due_at"], "interval": row["interval"], "ease": row["ease"]})
+        return jsonify(result)
 
     return jsonify({"error": "word not found"}), 404
 
 
 # ============================================================
-# 隨機字（維持原本功能）
+# 隨機字（依 count / reviewed / seen 加權抽樣）
 # ============================================================
+RANDOM_MAX = 200
+
+
 @words_bp.route("/random", methods=["GET"])
 def random_word():
-    words = load_json_file(WORDS_FILE)
+    """
+    未指定 n：回傳單一單字（與原本格式相同）
+    ?n=10   ：回傳最多 10 個不重複的單字（測驗出題用）
+    """
+    n = request.args.get("n")
+    try:
+        count = min(max(int(n), 1), RANDOM_MAX) if n is not None else 1
+    except ValueError:
+        return jsonify({"error": "invalid n"}), 400
+
+    refresh_caches()
+    words = get_word_sampler().sample(count)
     if not words:
         return jsonify({"error": "no words"})
-    return jsonify(random.choice(words))
+    return jsonify(words if n is not None else words[0])
 
 
 # ============================================================
@@ -114,18 +212,22 @@ def random_word():
 # ============================================================
 @words_bp.route("/words/stats", methods=["GET"])
 def words_stats():
-    words = load_json_file(WORDS_FILE)
-    seen = load_json_file(SEEN_WORDS_FILE)
-
-    total_words = len(words)
-    total_seen = len(seen)
-    avg_count = sum(w.get("count", 0) for w in words) / total_words if total_words else 0
+    """
+    統計由記憶體中的累計值提供（隨每次寫入逐筆更新），不需掃描字彙庫。
+    ?days=N：added_per_day 只回傳最近 N 個日期
+    """
+    days = request.args.get("days")
+    try:
+        days = int(days) if days is not None else None
+    except ValueError:
+        return jsonify({"error": "invalid days"}), 400
 
-    return jsonify({
-        "total_words": total_words,
-        "total_seen": total_seen,
-        "avg_count": round(avg_count, 2)
-    })
+    refresh_caches()
+    stats = get_word_stats().snapshot(days)
+    counter = get_seen_counter()
+    stats["total_seen"] = len(counter.counts())
+    stats["total_seen_occurrences"] = counter.total()
+    return jsonify(stats)
 
 
 # ============================================================
@@ -134,12 +236,11 @@ def words_stats():
 @words_bp.route("/words/batch", methods=["POST"])
 def add_words_batch():
     items = request.json or []
-    words = load_json_file(WORDS_FILE)
-    seen = load_json_file(SEEN_WORDS_FILE)
+    store = get_word_store()
+    seen = get_seen_words()
 
-    existing = {w["word"]: w for w in words}
-
-    added = updated = skipped = 0
+    skipped = 0
+    entries = []
 
     for item in items:
         word = (item.get("word") or "").strip().lower()
@@ -148,26 +249,13 @@ def add_words_batch():
             continue
 
         # 自動兼容 zh / definition
-        definition = (item.get("definition") or item.get("zh") or "").strip()
-        added_by = item.get("added_by", "batch")
-        count = seen.get(word, 1)
-
-        if word in existing:
-            existing[word]["count"] = existing[word].get("count", 0) + count
-            if definition:
-                existing[word]["definition"] = definition
-            updated += 1
-        else:
-            existing[word] = {
-                "word": word,
-                "definition": definition,
-                "reviewed": 0,
-                "count": count,
-                "added_by": added_by
-            }
-            added += 1
-
-    # 寫回
-    write_words_file(list(existing.values()))
+        entries.append({
+            "word": word,
+            "definition": (item.get("definition") or item.get("zh") or "").strip(),
+            "added_by": item.get("added_by", "batch"),
+            "count": seen.get(word, 1),
+        })
 
+    # 整批一次寫入（sqlite 一個交易、json 一次寫回）
+    added, updated = store.add_words(entries)
     return jsonify({"status": "ok", "added": added, "updated": updated, "skipped": skipped})
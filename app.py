@@ -6,6 +6,8 @@ from cache import refresh_caches
 from api_import_export import api_import_export_bp
 from api_articles import articles_bp
 from api_trigger_n8n import trigger_bp
+from api_lookup import lookup_bp
+from metrics import init_metrics
 
 
 app = Flask(__name__)
@@ -17,6 +19,10 @@ app.register_blueprint(parse_bp)
 app.register_blueprint(api_import_export_bp)
 app.register_blueprint(articles_bp)
 app.register_blueprint(trigger_bp)
+app.register_blueprint(lookup_bp)
+
+# 每個 route 的延遲、快取重載與檔案 I/O 指標（GET /metrics）
+init_metrics(app)
 
 if __name__ == "__main__":
     refresh_caches()  # 啟動時預先快取
@@ -0,0 +1,195 @@
+# article_index.py
+"""
+文章單字反向索引（data/articles/word_index.db）
+
+word -> (filename, 詞頻)，使用與 api_parse.parse_article 相同的斷詞規則，
+save_article_internal 儲存文章時逐篇更新。查詢時只讀取相關單字的 posting，
+不需要掃描 data/articles/*.json。
+
+文章目錄由外部複製進來時可重建：
+    python article_index.py rebuild
+"""
+import json
+import math
+import os
+import sqlite3
+import sys
+import threading
+from collections import Counter
+
+from api_parse import tokenize
+from article_segments import iter_articles
+
+INDEX_NAME = "word_index.db"
+
+
+class ArticleWordIndex:
+
+    def __init__(self, articles_dir, auto_build=True):
+        self.articles_dir = articles_dir
+        self.path = os.path.join(articles_dir, INDEX_NAME)
+        self._lock = threading.Lock()
+
+        is_new = not os.path.exists(self.path)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS postings (
+                word     TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                tf       INTEGER NOT NULL,
+                PRIMARY KEY (word, filename)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS postings_filename ON postings (filename);
+            CREATE TABLE IF NOT EXISTS articles (
+                filename TEXT PRIMARY KEY,
+                tokens   INTEGER NOT NULL
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS profiles (
+                filename     TEXT PRIMARY KEY,
+                dict_version TEXT NOT NULL,
+                profile      TEXT NOT NULL
+            ) WITHOUT ROWID;
+        """)
+        if is_new and auto_build:
+            self.rebuild()
+
+    # ----------------------------------------------------
+    # 寫入
+    # ----------------------------------------------------
+    def _index_locked(self, filename, text, replace=True):
+        tokens = tokenize(text or "")
+        if replace:
+            self._conn.execute("DELETE FROM postings WHERE filename = ?", (filename,))
+        self._conn.executemany(
+            "INSERT INTO postings (word, filename, tf) VALUES (?, ?, ?)",
+            [(w, filename, tf) for w, tf in Counter(tokens).items()],
+        )
+        self._conn.execute(
+            "INSERT OR REPLACE INTO articles (filename, tokens) VALUES (?, ?)",
+            (filename, len(tokens)),
+        )
+
+    def _set_profile_locked(self, filename, profile, dict_version):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO profiles (filename, dict_version, profile) VALUES (?, ?, ?)",
+            (filename, dict_version, json.dumps(profile, ensure_ascii=False, separators=(",", ":"))),
+        )
+
+    def add_article(self, filename, text, profile=None, dict_version=None):
+        """profile 為 article_profile.build_profile 的結果，與索引在同一個交易中寫入"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._index_locked(filename, text)
+                if profile is not None:
+                    self._set_profile_locked(filename, profile, dict_version)
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def rebuild(self):
+        """重新掃描文章目錄建立索引"""
+        total = 0
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM postings")
+                self._conn.execute("DELETE FROM articles")
+                self._conn.execute("DELETE FROM profiles")
+                for fname, item in iter_articles(self.articles_dir):
+                    self._index_locked(fname, item.get("text", ""), replace=False)
+                    total += 1
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        print(f"[WordIndex] Rebuilt {self.path} ({total:,})")
+        return total
+
+    def set_profiles(self, profiles, dict_version):
+        """profiles：{filename: profile}（字典版本改變後重新計算的結果）"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for filename, profile in profiles.items():
+                    self._set_profile_locked(filename, profile, dict_version)
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    # ----------------------------------------------------
+    # 查詢
+    # ----------------------------------------------------
+    def get_profiles(self, filenames, dict_version):
+        """{filename: profile}；沒有 profile 或字典版本不同的文章不在結果中"""
+        found = {}
+        filenames = list(filenames)
+        with self._lock:
+            for i in range(0, len(filenames), 500):
+                chunk = filenames[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT filename, profile FROM profiles "
+                    f"WHERE dict_version = ? AND filename IN ({','.join('?' for _ in chunk)})",
+                    [dict_version] + chunk,
+                ).fetchall()
+                for filename, profile in rows:
+                    found[filename] = json.loads(profile)
+        return found
+
+    def search(self, words, limit=20):
+        """
+        回傳包含指定單字的文章，依「命中單字數 → tf-idf 分數」排序：
+            [{"filename", "score", "matched", "hits"}, ...]
+        """
+        words = sorted({w.strip().lower() for w in words if w and w.strip()})
+        if not words:
+            return []
+
+        with self._lock:
+            total = self._conn.execute("SELECT COUNT(*) FROM articles").fetchone()[0]
+            weights = {}
+            for w in words:
+                df = self._conn.execute(
+                    "SELECT COUNT(*) FROM postings WHERE word = ?", (w,)
+                ).fetchone()[0]
+                if df:
+                    weights[w] = math.log(1 + total / df)
+            if not weights:
+                return []
+
+            case = " ".join("WHEN ? THEN ?" for _ in weights)
+            params = [v for item in weights.items() for v in item]
+            placeholders = ",".join("?" for _ in weights)
+            rows = self._conn.execute(
+                f"""
+                SELECT filename,
+                       SUM((CASE word {case} END) * tf * 1.0 / (tf + 1.2)) AS score,
+                       COUNT(*) AS matched,
+                       SUM(tf) AS hits
+                FROM postings
+                WHERE word IN ({placeholders})
+                GROUP BY filename
+                ORDER BY matched DESC, score DESC
+                LIMIT ?
+                """,
+                params + list(weights) + [limit],
+            ).fetchall()
+
+        return [
+            {"filename": f, "score": round(score, 4), "matched": matched, "hits": hits}
+            for f, score, matched, hits in rows
+        ]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "rebuild":
+        print("usage: python article_index.py rebuild [articles_dir]")
+        sys.exit(1)
+    articles_dir = sys.argv[2] if len(sys.argv) > 2 else os.path.join("data", "articles")
+    total = ArticleWordIndex(articles_dir, auto_build=False).rebuild()
+    print(f"重建完成，共 {total} 篇文章")
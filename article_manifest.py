@@ -0,0 +1,196 @@
+# article_manifest.py
+"""
+文章清單索引（data/articles/_manifest.jsonl）
+
+每篇文章儲存時 append 一行 metadata，/api/articles/list 直接讀取記憶體中的索引，
+不必逐一開啟文章檔。其他 worker append 的內容以檔案大小偵測、只讀新增的部分；
+檔案被重建（換成另一個 inode）或變小時整份重讀。
+
+若文章目錄是從外部複製進來的，可重建索引：
+    python article_manifest.py rebuild
+"""
+import bisect
+import json
+import os
+import sys
+import threading
+from contextlib import contextmanager
+
+from article_segments import has_articles, iter_articles
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+MANIFEST_NAME = "_manifest.jsonl"
+
+
+def _entry_from_article(filename, item):
+    return {
+        "filename": filename,
+        "title": item.get("title", "untitled"),
+        "source": item.get("source", "manual"),
+        "created_at": item.get("created_at", "unknown"),
+        "length": len(item.get("text", "")),
+    }
+
+
+class ArticleManifest:
+
+    def __init__(self, articles_dir):
+        self.articles_dir = articles_dir
+        self.path = os.path.join(articles_dir, MANIFEST_NAME)
+        self._lock = threading.Lock()
+        self._keys = []       # 依 filename 排序（檔名以時間戳開頭，即依時間排序）
+        self._entries = {}    # filename -> entry
+        self._offset = 0      # 已讀取到的檔案位置
+        self._identity = None  # 已讀取的檔案 (st_dev, st_ino)
+
+    # ----------------------------------------------------
+    # 載入 / 同步
+    # ----------------------------------------------------
+    def _reset(self):
+        self._keys, self._entries, self._offset, self._identity = [], {}, 0, None
+
+    def _add(self, entry):
+        filename = entry["filename"]
+        if filename not in self._entries:
+            bisect.insort(self._keys, filename)
+        self._entries[filename] = entry
+
+    def _sync(self):
+        """讀入檔案中尚未載入的行；檔案被替換（inode 不同）或變小代表已被重建，整份重讀"""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            # 其他 worker 已先重建時，改為直接讀取它寫好的檔案
+            if not has_articles(self.articles_dir) or self._rebuild_locked(only_if_missing=True):
+                return
+            st = os.stat(self.path)
+        if (st.st_dev, st.st_ino) == self._identity and st.st_size == self._offset:
+            return
+        with open(self.path, "rb") as f:
+            # 以開啟的檔案判斷，避免 stat 與 open 之間檔案被替換
+            st = os.fstat(f.fileno())
+            if (st.st_dev, st.st_ino) != self._identity or st.st_size < self._offset:
+                self._reset()
+                self._identity = (st.st_dev, st.st_ino)
+            f.seek(self._offset)
+            data = f.read()
+        # 只處理完整的行，其他 worker 寫到一半的行留待下次
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            try:
+                self._add(json.loads(line))
+            except ValueError:
+                continue
+        self._offset += end
+
+    @contextmanager
+    def _file_lock(self):
+        """append 與重建共用的跨 process 鎖；重建會替換檔案，因此不能鎖在 manifest 本身"""
+        if fcntl is None:
+            yield
+            return
+        with open(f"{self.path}.lock", "a") as lock_fp:
+            fcntl.flock(lock_fp, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_fp, fcntl.LOCK_UN)
+
+    def _append_line(self, entry):
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._file_lock(), open(self.path, "ab") as f:
+            f.write(line)
+            f.flush()
+
+    def _rebuild_locked(self, only_if_missing=False):
+        """
+        掃描文章目錄重建 manifest（需持有 self._lock）。
+        掃描、寫檔與替換都在檔案鎖內完成：其他 worker 的 append 會等到替換後才寫入新檔，不會遺失；
+        only_if_missing 時若檔案已由其他 worker 建立則不重建，回傳 False。
+        """
+        with self._file_lock():
+            if only_if_missing and os.path.exists(self.path):
+                return False
+            self._reset()
+            for fname, item in iter_articles(self.articles_dir):
+                self._add(_entry_from_article(fname, item))
+
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    for filename in self._keys:
+                        f.write(json.dumps(self._entries[filename], ensure_ascii=False) + "\n")
+                os.replace(tmp_path, self.path)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            st = os.stat(self.path)
+            self._offset, self._identity = st.st_size, (st.st_dev, st.st_ino)
+        print(f"[Manifest] Rebuilt {self.path} ({len(self._keys):,})")
+        return True
+
+    # ----------------------------------------------------
+    # 公開介面
+    # ----------------------------------------------------
+    def add_article(self, filename, item):
+        entry = _entry_from_article(filename, item)
+        with self._lock:
+            self._sync()
+            self._append_line(entry)
+            self._sync()
+        return entry
+
+    def rebuild(self):
+        with self._lock:
+            self._rebuild_locked()
+            return len(self._keys)
+
+    def get(self, filename):
+        with self._lock:
+            self._sync()
+            return self._entries.get(filename)
+
+    def query(self, limit=None, cursor=None, source=None, date_from=None, date_to=None):
+        """
+        由新到舊列出文章。
+        cursor    ：上一頁最後一筆的 filename
+        date_from / date_to：YYYY-MM-DD（含）
+        回傳 (items, next_cursor)
+        """
+        with self._lock:
+            self._sync()
+            keys, entries = self._keys, self._entries
+            end = bisect.bisect_left(keys, cursor) if cursor else len(keys)
+            if date_to:
+                # 檔名以 YYYY-MM-DD_HHMMSS 開頭，可直接二分定位
+                end = min(end, bisect.bisect_right(keys, f"{date_to}_\uffff"))
+
+            items = []
+            i = end - 1
+            while i >= 0:
+                entry = entries[keys[i]]
+                day = entry["created_at"][:10]
+                if date_from and day < date_from:
+                    break  # 已早於起始日期，後面只會更早
+                if (not source or entry["source"] == source) and (not date_to or day <= date_to):
+                    items.append(entry)
+                    if limit and len(items) >= limit:
+                        break
+                i -= 1
+
+        next_cursor = items[-1]["filename"] if limit and len(items) >= limit and i > 0 else None
+        return items, next_cursor
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "rebuild":
+        print("usage: python article_manifest.py rebuild [articles_dir]")
+        sys.exit(1)
+    articles_dir = sys.argv[2] if len(sys.argv) > 2 else os.path.join("data", "articles")
+    total = ArticleManifest(articles_dir).rebuild()
+    print(f"重建完成，共 {total} 篇文章")
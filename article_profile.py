@@ -0,0 +1,87 @@
+# article_profile.py
+"""
+文章字彙 profile 與生字覆蓋率
+
+儲存文章時把每個 token 對應到字典中的詞條（lemma），記錄各詞條的出現次數：
+- token 本身就是詞條時直接使用；否則依序嘗試去掉常見的詞尾變化（studies → study、running → run）
+- 字典查不到的 token（人名、拼錯的字）不算詞條，另記於 unlisted
+- 沒有載入字典時，token 本身即為詞條
+
+profile = {"lemmas": {lemma: 出現次數}, "forms": {lemma: [變化形 token]}, "unlisted": {token: 出現次數}, "tokens": 列入的 token 數}：
+- forms 記錄文章中與詞條不同的 token（study 的 studies），使用者存的是變化形時也算已知
+- unlisted 為字典查不到的 token，只有在使用者字彙中時才列入（使用者自己加的字不一定在字典裡）
+與產生時的字典版本（profile_version）一起存於 word_index.db；版本改變後，下次讀取時才重新計算。
+覆蓋率只需逐一檢查 profile 的詞條是否在使用者字彙中，不需要重新解析文章。
+"""
+from api_parse import tokenize
+
+# (詞尾, 取代為)；依序嘗試，第一個在字典中的結果即為 lemma
+INFLECTIONS = (
+    ("ies", "y"), ("ied", "y"), ("ves", "f"),
+    ("es", ""), ("s", ""),
+    ("ed", ""), ("ed", "e"), ("ing", ""), ("ing", "e"),
+    ("er", ""), ("est", ""), ("ily", "y"), ("ly", ""),
+)
+_MIN_STEM = 2
+PROFILE_FORMAT = 2   # profile 結構改變時遞增，舊的 profile 會重新計算
+
+
+def profile_version(dict_version):
+    """存入 word_index.db 的版本字串（profile 格式 + 字典版本）"""
+    return f"{PROFILE_FORMAT}/{dict_version}"
+
+
+def lemmatize(word, dictionary):
+    """word 在字典中的詞條；查不到時回傳 None"""
+    if not dictionary or word in dictionary:
+        return word
+    for suffix, replacement in INFLECTIONS:
+        if not word.endswith(suffix) or len(word) - len(suffix) < _MIN_STEM:
+            continue
+        stem = word[:-len(suffix)]
+        candidate = stem + replacement
+        if candidate in dictionary:
+            return candidate
+        # 重複子音：running → run、stopped → stop
+        if not replacement and len(stem) > _MIN_STEM and stem[-1] == stem[-2] and stem[:-1] in dictionary:
+            return stem[:-1]
+    return None
+
+
+def build_profile(text, dictionary):
+    lemmas, forms, unlisted, memo = {}, {}, {}, {}
+    tokens = 0
+    for token in tokenize(text or ""):
+        lemma = memo[token] if token in memo else memo.setdefault(token, lemmatize(token, dictionary))
+        if lemma is None:
+            unlisted[token] = unlisted.get(token, 0) + 1
+            continue
+        lemmas[lemma] = lemmas.get(lemma, 0) + 1
+        if token != lemma and token not in forms.setdefault(lemma, []):
+            forms[lemma].append(token)
+        tokens += 1
+    return {"lemmas": lemmas, "forms": forms, "unlisted": unlisted, "tokens": tokens}
+
+
+def coverage(profile, user_words):
+    """
+    unique  ：文章中的詞條數
+    known   ：其中已在使用者字彙的詞條數（詞條本身或文章中的變化形在字彙中；unknown = unique - known）
+    coverage：已知詞條的出現次數佔全部出現次數的比例
+    字典查不到、但在使用者字彙中的 token 視為已知的詞條
+    """
+    lemmas, forms = profile["lemmas"], profile.get("forms", {})
+    known = [
+        n for lemma, n in lemmas.items()
+        if lemma in user_words or any(form in user_words for form in forms.get(lemma, ()))
+    ]
+    extra = [n for token, n in profile.get("unlisted", {}).items() if token in user_words]
+    known += extra
+    unique = len(lemmas) + len(extra)
+    tokens = profile["tokens"] + sum(extra)
+    return {
+        "unique": unique,
+        "known": len(known),
+        "unknown": unique - len(known),
+        "coverage": round(sum(known) / tokens, 4) if tokens else 0,
+    }
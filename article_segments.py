@@ -0,0 +1,245 @@
+# article_segments.py
+"""
+文章 segment 儲存（data/articles/segments/）
+
+每篇文章壓縮後 append 到目前的 segment 檔（seg-000001.dat），
+segment 超過 SEGMENT_MAX_MB 時換下一個檔案；同名的 .idx 每篇記錄一行
+{"filename", "offset", "length"}，載入時直接 seek 到該筆記錄，不需要掃描目錄或解壓其他文章。
+
+- 每筆記錄各自以 zlib 壓縮，讀取單篇只需解壓該筆
+- 舊版的 filename 仍是文章的 key（清單索引、單字索引、/api/articles/load 都沿用）
+- 其他 worker append 的 .idx 以檔案大小偵測、只讀新增的部分（與 _manifest.jsonl 相同）
+- 尚未轉換的 *.json 文章仍可讀取；轉換既有目錄：
+    python article_segments.py migrate [articles_dir] [--keep]
+"""
+import glob
+import json
+import os
+import struct
+import sys
+import threading
+import zlib
+
+import metrics
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+SEGMENTS_DIR = "segments"
+SEGMENT_MAX_MB = float(os.environ.get("ARTICLE_SEGMENT_MAX_MB", "64"))
+COMPRESS_LEVEL = 6
+
+_HEADER = struct.Struct("<II")   # 壓縮後長度, crc32
+
+
+def _segment_name(number):
+    return f"seg-{number:06d}"
+
+
+class ArticleSegmentStore:
+
+    def __init__(self, articles_dir, max_mb=SEGMENT_MAX_MB):
+        self.articles_dir = articles_dir
+        self.dir = os.path.join(articles_dir, SEGMENTS_DIR)
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        os.makedirs(self.dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._index = {}      # filename -> (segment 編號, offset, length)
+        self._offsets = {}    # segment 編號 -> 已讀取到的 .idx 位置
+
+    # ----------------------------------------------------
+    # 索引
+    # ----------------------------------------------------
+    def _path(self, number, ext):
+        return os.path.join(self.dir, f"{_segment_name(number)}.{ext}")
+
+    def _segments(self):
+        numbers = []
+        for path in glob.glob(os.path.join(glob.escape(self.dir), "seg-*.idx")):
+            try:
+                numbers.append(int(os.path.basename(path)[4:-4]))
+            except ValueError:
+                continue
+        return sorted(numbers)
+
+    def _sync(self):
+        """讀入各 .idx 尚未載入的行（後寫入的同名文章覆蓋先前的記錄）"""
+        for number in self._segments():
+            path = self._path(number, "idx")
+            offset = self._offsets.get(number, 0)
+            size = os.path.getsize(path)
+            if size == offset:
+                continue
+            with open(path, "rb") as f:
+                f.seek(offset)
+                data = f.read()
+            # 只處理完整的行，其他 worker 寫到一半的行留待下次
+            end = data.rfind(b"\n") + 1
+            for line in data[:end].splitlines():
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                self._index[entry["filename"]] = (number, entry["offset"], entry["length"])
+            self._offsets[number] = offset + end
+
+    # ----------------------------------------------------
+    # 寫入
+    # ----------------------------------------------------
+    def _file_lock(self):
+        return open(os.path.join(self.dir, ".lock"), "a")
+
+    def append(self, filename, item):
+        """壓縮後 append 到目前的 segment；回傳 (segment 檔路徑, 寫入的 bytes)"""
+        payload = zlib.compress(json.dumps(item, ensure_ascii=False).encode("utf-8"), COMPRESS_LEVEL)
+        record = _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+        with self._lock, self._file_lock() as lock_fp:
+            if fcntl:
+                fcntl.flock(lock_fp, fcntl.LOCK_EX)
+            try:
+                segments = self._segments()
+                number = segments[-1] if segments else 1
+                data_path = self._path(number, "dat")
+                if os.path.exists(data_path) and os.path.getsize(data_path) >= self.max_bytes:
+                    number += 1
+                    data_path = self._path(number, "dat")
+
+                with open(data_path, "ab") as f:
+                    offset = f.tell()
+                    f.write(record)
+                    f.flush()
+                    os.fsync(f.fileno())
+                # 記錄寫完才寫索引，讀取端看到的索引一定指向完整的記錄
+                line = json.dumps({"filename": filename, "offset": offset, "length": len(record)}, ensure_ascii=False)
+                with open(self._path(number, "idx"), "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+                    f.flush()
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_fp, fcntl.LOCK_UN)
+            self._sync()
+
+        metrics.record_io("article", "write", len(record))
+        return data_path, len(record)
+
+    # ----------------------------------------------------
+    # 讀取
+    # ----------------------------------------------------
+    def _locate(self, filename):
+        with self._lock:
+            location = self._index.get(filename)
+            if location is None:
+                self._sync()
+                location = self._index.get(filename)
+            return location
+
+    def __contains__(self, filename):
+        return self._locate(filename) is not None
+
+    def load(self, filename):
+        """回傳文章 dict；不在 segment 中時回傳 None"""
+        location = self._locate(filename)
+        if location is None:
+            return None
+        number, offset, length = location
+        with open(self._path(number, "dat"), "rb") as f:
+            f.seek(offset)
+            record = f.read(length)
+        metrics.record_io("article", "read", len(record))
+
+        size, crc = _HEADER.unpack_from(record)
+        payload = record[_HEADER.size:_HEADER.size + size]
+        if len(payload) != size or zlib.crc32(payload) != crc:
+            raise ValueError(f"corrupt article record: {filename}")
+        return json.loads(zlib.decompress(payload))
+
+    def filenames(self):
+        with self._lock:
+            self._sync()
+            return sorted(self._index)
+
+    def stats(self):
+        with self._lock:
+            self._sync()
+            segments = self._segments()
+            return {
+                "articles": len(self._index),
+                "segments": len(segments),
+                "bytes": sum(os.path.getsize(self._path(n, "dat")) for n in segments
+                             if os.path.exists(self._path(n, "dat"))),
+            }
+
+
+# ============================================================
+# 文章目錄走訪（segment + 尚未轉換的 *.json）
+# ============================================================
+def _load_json_article(articles_dir, filename):
+    with open(os.path.join(articles_dir, filename), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def has_articles(articles_dir):
+    if not os.path.isdir(articles_dir):
+        return False
+    return any(f.endswith(".json") for f in os.listdir(articles_dir)) or bool(
+        glob.glob(os.path.join(glob.escape(articles_dir), SEGMENTS_DIR, "seg-*.idx"))
+    )
+
+
+def iter_articles(articles_dir, store=None):
+    """依 filename 排序回傳 (filename, article)；同名時以 segment 中的版本為準，讀取失敗的文章略過"""
+    store = store or ArticleSegmentStore(articles_dir)
+    in_segments = set(store.filenames())
+    loose = {
+        f for f in os.listdir(articles_dir)
+        if f.endswith(".json") and f not in in_segments
+    } if os.path.isdir(articles_dir) else set()
+
+    for filename in sorted(in_segments | loose):
+        try:
+            if filename in loose:
+                yield filename, _load_json_article(articles_dir, filename)
+            else:
+                yield filename, store.load(filename)
+        except Exception:
+            continue
+
+
+def migrate(articles_dir, keep=False):
+    """把目錄中的 *.json 文章轉入 segment；keep=False 時轉換後刪除原檔"""
+    store = ArticleSegmentStore(articles_dir)
+    in_segments = set(store.filenames())
+    migrated = skipped = before = after = 0
+    for filename in sorted(os.listdir(articles_dir)):
+        if not filename.endswith(".json"):
+            continue
+        path = os.path.join(articles_dir, filename)
+        if filename not in in_segments:
+            try:
+                article = _load_json_article(articles_dir, filename)
+            except Exception as e:
+                print(f"[Segments] skip {filename}: {e}")
+                skipped += 1
+                continue
+            before += os.path.getsize(path)
+            after += store.append(filename, article)[1]
+            migrated += 1
+        if not keep:
+            os.remove(path)
+    return {"migrated": migrated, "skipped": skipped, "json_bytes": before, "segment_bytes": after}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "migrate":
+        print("usage: python article_segments.py migrate [articles_dir] [--keep]")
+        sys.exit(1)
+    args = [a for a in sys.argv[2:] if not a.startswith("--")]
+    articles_dir = args[0] if args else os.path.join("data", "articles")
+    result = migrate(articles_dir, keep="--keep" in sys.argv)
+    ratio = result["segment_bytes"] / result["json_bytes"] if result["json_bytes"] else 0
+    print(f"[Segments] Migrated {result['migrated']:,} articles "
+          f"({result['json_bytes'] / 1024 / 1024:.1f} MB → {result['segment_bytes'] / 1024 / 1024:.1f} MB, "
+          f"{ratio:.0%}), skipped {result['skipped']:,}")
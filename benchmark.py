@@ -0,0 +1,346 @@
+# benchmark.py
+"""
+HTTP API / 資料層效能基準
+
+在暫存目錄產生合成資料（ECDICT、words.json、seen_words.json、文章），
+以 Flask test client 依序呼叫各 endpoint，輸出每個情境的 p50 / p99 延遲、吞吐量與記憶體峰值（JSON）。
+相同的 --seed / --scale 產生的資料相同，結果可在不同 commit 之間比較：
+
+    python benchmark.py --output before.json
+    git checkout <其他 commit>
+    python benchmark.py --output after.json --compare before.json
+
+--scale 0.01 可快速試跑（資料量依比例縮小）。
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import shutil
+import string
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# scale = 1 時的資料量
+DATASET = {
+    "ecdict": 300_000,
+    "words": 100_000,
+    "seen": 1_000_000,
+    "articles": 20_000,
+}
+ARTICLE_TOKENS = 400
+MEMORY_ITERATIONS = 10   # 每個情境另外以 tracemalloc 量測記憶體的請求數
+STOPWORDS = ["the", "a", "of", "to", "and", "in", "is", "for", "with", "on"]
+
+
+# ============================================================
+# 合成資料
+# ============================================================
+def _make_vocab(rng, size):
+    """size 個不重複的假單字，前段較短（模擬常用字）"""
+    letters = string.ascii_lowercase
+    vocab, seen = [], set()
+    while len(vocab) < size:
+        length = min(3 + int(rng.expovariate(0.35)), 16)
+        w = "".join(rng.choices(letters, k=length))
+        if w not in seen:
+            seen.add(w)
+            vocab.append(w)
+    return vocab
+
+
+def _make_text(rng, common, cum_weights, tokens=ARTICLE_TOKENS):
+    words = rng.choices(common, cum_weights=cum_weights, k=tokens)
+    for i in range(0, tokens, 5):
+        words[i] = rng.choice(STOPWORDS)
+    sentences = [" ".join(words[i:i + 20]).capitalize() + "." for i in range(0, tokens, 20)]
+    return " ".join(sentences)
+
+
+def generate_dataset(workdir, scale=1.0, seed=42, ecdict_bin=False):
+    rng = random.Random(seed)
+    sizes = {k: max(int(v * scale), 10) for k, v in DATASET.items()}
+    sizes["seen"] = max(sizes["seen"], sizes["ecdict"])
+
+    vocab = _make_vocab(rng, sizes["seen"])
+    ecdict = {w: f"譯{i}" for i, w in enumerate(vocab[:sizes["ecdict"]])}
+
+    now = int(time.mktime((2025, 1, 1, 0, 0, 0, 0, 0, -1)))   # 固定時間，資料可重現
+    words = [
+        {
+            "word": w,
+            "definition": ecdict[w],
+            "reviewed": rng.randint(0, 8),
+            "count": rng.randint(1, 50),
+            "added_by": rng.choice(["manual", "batch", "n8n"]),
+            "added_at": now - rng.randint(0, 365 * 86400),
+        }
+        for w in rng.sample(vocab[:sizes["ecdict"]], sizes["words"])
+    ]
+    seen = {w: rng.randint(1, 500) for w in vocab}
+
+    with open(os.path.join(workdir, "ecdict.json"), "w", encoding="utf-8") as f:
+        json.dump(ecdict, f, ensure_ascii=False)
+    if ecdict_bin:
+        sys.path.insert(0, REPO_DIR)
+        from ecdict_bin import build_ecdict_bin
+        build_ecdict_bin(ecdict, os.path.join(workdir, "ecdict.bin"))
+    with open(os.path.join(workdir, "words.json"), "w", encoding="utf-8") as f:
+        json.dump(words, f, ensure_ascii=False)
+    with open(os.path.join(workdir, "seen_words.json"), "w", encoding="utf-8") as f:
+        json.dump(seen, f, ensure_ascii=False)
+
+    # 文章用字集中在前段詞彙（Zipf 分布）
+    common = vocab[:min(50_000, sizes["ecdict"])]
+    cum, total = [], 0.0
+    for i in range(len(common)):
+        total += 1.0 / (i + 1)
+        cum.append(total)
+
+    articles_dir = os.path.join(workdir, "data", "articles")
+    os.makedirs(articles_dir, exist_ok=True)
+    base = time.mktime((2024, 1, 1, 0, 0, 0, 0, 0, -1))
+    for i in range(sizes["articles"]):
+        stamp = time.strftime("%Y-%m-%d_%H%M%S", time.localtime(base + i * 600))
+        payload = {
+            "title": f"Article {i}",
+            "text": _make_text(rng, common, cum),
+            "source": rng.choice(["manual", "n8n"]),
+            "created_at": stamp,
+        }
+        with open(os.path.join(articles_dir, f"{stamp}_Article_{i}.json"), "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+
+    return sizes, (rng, common, cum)
+
+
+# ============================================================
+# 量測
+# ============================================================
+def _peak_rss_mb():
+    """整個 process 的 RSS 峰值（只增不減，無法區分情境）"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 單位為 KB，macOS 為 bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def _peak_alloc_mb(client, request_fn, start, iterations=MEMORY_ITERATIONS):
+    """
+    以 tracemalloc 量測情境執行期間新配置的 Python 記憶體峰值。
+    tracemalloc 會拖慢每次配置，因此與計時分開、只跑少數請求；C extension 自行配置的記憶體不列入。
+    """
+    tracemalloc.start()
+    try:
+        for i in range(start, start + iterations):
+            request_fn(client, i).get_data()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return round(peak / 1024 / 1024, 2)
+
+
+def run_scenario(client, name, request_fn, iterations, warmup=3):
+    for i in range(warmup):
+        request_fn(client, -1 - i)
+
+    latencies, errors = [], 0
+    started = time.perf_counter()
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        resp = request_fn(client, i)
+        resp.get_data()   # 串流回應需讀完 body 才算完成
+        latencies.append(time.perf_counter() - t0)
+        if resp.status_code >= 400:
+            errors += 1
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    ms = lambda v: round(v * 1000, 3) if v is not None else None
+    return {
+        "name": name,
+        "iterations": iterations,
+        "errors": errors,
+        "p50_ms": ms(_percentile(latencies, 50)),
+        "p99_ms": ms(_percentile(latencies, 99)),
+        "mean_ms": ms(sum(latencies) / len(latencies)) if latencies else None,
+        "max_ms": ms(latencies[-1]) if latencies else None,
+        "throughput_rps": round(iterations / elapsed, 2) if elapsed else None,
+        # i 接續計時的請求，避免重複的單字 / 文字命中快取
+        "peak_alloc_mb": _peak_alloc_mb(client, request_fn, iterations),
+    }
+
+
+def build_scenarios(iterations, text_source):
+    rng, common, cum = text_source
+    texts = [_make_text(rng, common, cum) for _ in range(32)]
+    heavy = max(iterations // 20, 5)
+
+    def parse_cold(c, i):
+        # 每次附加不同的字，避開解析結果快取
+        return c.post("/api/parse", json={"text": f"{texts[i % len(texts)]} benchuniq{i + 10}x"})
+
+    def parse_hot(c, i):
+        return c.post("/api/parse", json={"text": texts[0]})
+
+    def parse_batch(c, i):
+        return c.post("/api/parse/batch", json={"texts": [f"{t} batchuniq{i + 10}x" for t in texts]})
+
+    def words_post(c, i):
+        return c.post("/api/words", json={"word": f"benchword{i + 10}", "definition": "bench"})
+
+    return [
+        ("parse_cold", parse_cold, iterations),
+        ("parse_hot", parse_hot, iterations),
+        ("parse_batch_32", parse_batch, heavy),
+        ("words_post", words_post, iterations),
+        ("words_list", lambda c, i: c.get("/api/words"), heavy),
+        ("words_stats", lambda c, i: c.get("/api/words/stats"), iterations),
+        ("random_10", lambda c, i: c.get("/api/random?n=10"), iterations),
+        ("export_json", lambda c, i: c.get("/api/export"), heavy),
+        ("export_csv", lambda c, i: c.get("/api/export?format=csv"), heavy),
+        ("articles_list_page", lambda c, i: c.get("/api/articles/list?limit=50"), iterations),
+        ("articles_list_all", lambda c, i: c.get("/api/articles/list"), heavy),
+    ]
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def compare(results, baseline):
+    """印出（stderr）與 baseline 的 p50 / p99 / 吞吐量比值"""
+    base = {s["name"]: s for s in baseline.get("scenarios", [])}
+    print(f"\n{'scenario':<22}{'p50 ms':>12}{'Δp50':>9}{'p99 ms':>12}{'Δp99':>9}{'rps':>10}{'Δrps':>9}",
+          file=sys.stderr)
+    for s in results["scenarios"]:
+        b = base.get(s["name"])
+        ratio = lambda key: (f"{s[key] / b[key]:.2f}x" if b and b.get(key) else "-")
+        print(f"{s['name']:<22}{s['p50_ms']:>12}{ratio('p50_ms'):>9}"
+              f"{s['p99_ms']:>12}{ratio('p99_ms'):>9}{s['throughput_rps']:>10}{ratio('throughput_rps'):>9}",
+              file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="API / 資料層效能基準")
+    parser.add_argument("--scale", type=float, default=1.0, help="資料量比例（預設 1.0）")
+    parser.add_argument("--iterations", type=int, default=200, help="每個情境的請求數")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--ecdict-bin", action="store_true", help="同時產生 ecdict.bin（mmap 格式）")
+    parser.add_argument("--only", help="只執行指定情境（逗號分隔）")
+    parser.add_argument("--workdir", help="資料目錄（預設為暫存目錄，結束後刪除）")
+    parser.add_argument("--output", help="結果 JSON 輸出路徑（預設輸出至 stdout）")
+    parser.add_argument("--compare", help="與先前的結果 JSON 比較")
+    args = parser.parse_args(argv)
+
+    commit = _git_commit()
+    workdir = args.workdir or tempfile.mkdtemp(prefix="vocab-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    output = os.path.abspath(args.output) if args.output else None
+    baseline_path = os.path.abspath(args.compare) if args.compare else None
+
+    # 應用程式的 log 改印到 stderr，stdout 只輸出結果 JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        sizes, scenarios, setup = _run(args, workdir)
+
+    results = {
+        "commit": commit,
+        "timestamp": int(time.time()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {"scale": args.scale, "iterations": args.iterations,
+                   "seed": args.seed, "ecdict_bin": args.ecdict_bin},
+        "dataset": sizes,
+        "setup": setup,
+        "peak_rss_mb": _peak_rss_mb(),
+        "scenarios": scenarios,
+    }
+
+    text = json.dumps(results, ensure_ascii=False, indent=2)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if baseline_path:
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            compare(results, json.load(f))
+    return results
+
+
+def _run(args, workdir):
+    cwd = os.getcwd()
+    try:
+        t0 = time.perf_counter()
+        sizes, text_source = generate_dataset(workdir, args.scale, args.seed, args.ecdict_bin)
+        generate_s = time.perf_counter() - t0
+        print(f"[Bench] dataset {sizes} in {generate_s:.1f}s ({workdir})", file=sys.stderr)
+
+        # 各模組以相對路徑存取資料，import 前先切換目錄
+        os.chdir(workdir)
+        sys.path.insert(0, REPO_DIR)
+        t0 = time.perf_counter()
+        from app import app
+        from cache import refresh_caches
+        import_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        refresh_caches()
+        warm_s = time.perf_counter() - t0
+
+        client = app.test_client()
+        only = set(args.only.split(",")) if args.only else None
+        scenarios = []
+        for name, fn, iterations in build_scenarios(args.iterations, text_source):
+            if only and name not in only:
+                continue
+            result = run_scenario(client, name, fn, iterations)
+            print(f"[Bench] {name:<22} p50={result['p50_ms']}ms p99={result['p99_ms']}ms "
+                  f"rps={result['throughput_rps']} alloc={result['peak_alloc_mb']}MB", file=sys.stderr)
+            scenarios.append(result)
+
+        # 結束前先寫回 seen 計數，避免 atexit 在切回原目錄後才寫檔
+        from cache import get_seen_counter
+        get_seen_counter().flush()
+    finally:
+        os.chdir(cwd)
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    setup = {
+        "generate_s": round(generate_s, 3),
+        "import_s": round(import_s, 3),     # 含文章清單 / 反向索引建立
+        "first_refresh_s": round(warm_s, 3),
+    }
+    return sizes, scenarios, setup
+
+
+if __name__ == "__main__":
+    main()
@@ -1,64 +1,328 @@
 # cache.py
-import os, json
+import os, json, time
+from collections import Counter
+import generation
+import metrics
+from ecdict_bin import EcdictReader
+from generation import GenerationCounter
 
 WORDS_FILE = "words.json"
 ECDICT_FILE = "ecdict.json"
+ECDICT_BIN_FILE = "ecdict.bin"    # 優先使用 mmap 二進位格式，無則退回 ecdict.json
+WORDS_DB_FILE = "words.db"
 SEEN_WORDS_FILE = "seen_words.json"
 SETTING_FILE = "setting.json"
+GENERATION_FILE = "cache.gen"     # 跨 worker 共用的資料版本號（mmap）
 
-_SEEN_CACHE = {}
-_SEEN_MTIME = 0
+# ECDICT 通常由轉換工具更新（會 bump 版本號）；手動替換檔案時最晚 N 秒內也會偵測到
+ECDICT_STAT_INTERVAL = 30
+
+# seen_words 寫回策略：累積超過 N 個不同單字或每隔 N 秒由背景 thread 寫回
+SEEN_FLUSH_INTERVAL = float(os.environ.get("SEEN_FLUSH_INTERVAL", 5))
+SEEN_FLUSH_THRESHOLD = int(os.environ.get("SEEN_FLUSH_THRESHOLD", 2000))
+
+# /api/random 加權抽樣表：其他 worker 寫回的 seen 計數最多每 N 秒重新套用一次
+SAMPLER_RESYNC_INTERVAL = 60
+
+# /api/parse?mode=unknown：reviewed 達到 N 次的單字視為已熟悉，不再回傳
+KNOWN_MIN_REVIEWED = int(os.environ.get("KNOWN_MIN_REVIEWED", 3))
+
+# 字彙庫儲存後端："sqlite"（預設，words.db）或 "json"（舊版 words.json 整檔覆寫）
+WORD_STORE_BACKEND = os.environ.get("WORD_STORE", "sqlite")
+
+_SEEN_COUNTER = None
 _EC_CACHE = {}
 _USER_CACHE = {}
 _EC_MTIME = 0
-_USER_MTIME = 0
+_EC_SEEN_GEN = None       # 上次檢查時的共用版本號
+_EC_NEXT_STAT = 0
+_USER_LOADED = False
+_USER_SEEN_GEN = None
+_USER_CURSOR = 0          # 已套用到 _USER_CACHE 的 word store 異動序號
+_WORD_STORE = None
+_GENERATIONS = None
+_SAMPLER = None
+_SAMPLER_SEEN_MERGES = None   # 抽樣表建立時，seen 計數器已合併其他 worker 寫回的次數
+_SAMPLER_NEXT_SYNC = 0
+_WORD_STATS = None
+_WORD_INDEX = None        # GET /api/words 分頁用的排序索引
+_EC_KEYS = None           # ecdict.json 的排序 key（/api/lookup 使用）
+_EC_KEYS_GEN = None
+_USER_KEYS = None
+_KNOWN_WORDS = set()      # reviewed >= KNOWN_MIN_REVIEWED 的單字，隨 user_cache_put / remove 更新
+_KNOWN_FROZEN = None      # get_known_words() 的 snapshot，_KNOWN_WORDS 改變時重建
+
+# 資料版本號：ECDICT / 字彙庫每次重載或異動時 +1，供衍生快取（如解析結果）判斷是否失效
+_EC_GEN = 0
+_USER_GEN = 0
 
 def load_json_file(path):
     try:
         with open(path, "r", encoding="utf-8") as f:
+            metrics.record_io(os.path.basename(path), "read", os.fstat(f.fileno()).st_size)
             return json.load(f)
     except Exception:
         return {}
 
-def refresh_caches():
-    """重新載入 ecdict.json / words.json / seen_words.json"""
-    global _EC_CACHE, _USER_CACHE, _SEEN_CACHE, _EC_MTIME, _USER_MTIME, _SEEN_MTIME
+def write_json_atomic(path, data, indent=None):
+    """先寫入暫存檔、fsync 後再 rename，避免寫到一半中斷留下殘缺的 JSON"""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        if indent is None:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        else:
+            json.dump(data, f, ensure_ascii=False, indent=indent)
+        f.flush()
+        os.fsync(f.fileno())
+        metrics.record_io(os.path.basename(path), "write", os.fstat(f.fileno()).st_size)
+    os.replace(tmp_path, path)
 
-    # ECDICT
-    if os.path.exists(ECDICT_FILE):
+def get_generations():
+    """跨 worker 共用的版本號（lazy 建立）"""
+    global _GENERATIONS
+    if _GENERATIONS is None:
+        _GENERATIONS = GenerationCounter(GENERATION_FILE)
+    return _GENERATIONS
+
+def bump_generation(slot):
+    """寫入端每次異動後呼叫，通知所有 worker 重新同步該資料集"""
+    return get_generations().bump(slot)
+
+def _reload_ecdict():
+    global _EC_CACHE, _EC_MTIME, _EC_GEN
+    started = time.perf_counter()
+
+    # ecdict.bin 以 mmap 共用 page cache；舊 reader 由 GC 關閉，避免進行中的查詢失效
+    if os.path.exists(ECDICT_BIN_FILE):
+        mtime = os.path.getmtime(ECDICT_BIN_FILE)
+        if mtime != _EC_MTIME:
+            _EC_CACHE = EcdictReader(ECDICT_BIN_FILE)
+            _EC_MTIME = mtime
+            _EC_GEN += 1
+            metrics.record_reload("ecdict", time.perf_counter() - started)
+            print(f"[Cache] Mapped {ECDICT_BIN_FILE} ({len(_EC_CACHE):,})")
+    elif os.path.exists(ECDICT_FILE):
         mtime = os.path.getmtime(ECDICT_FILE)
         if mtime != _EC_MTIME:
             _EC_CACHE = load_json_file(ECDICT_FILE)
             _EC_MTIME = mtime
+            _EC_GEN += 1
+            metrics.record_reload("ecdict", time.perf_counter() - started)
             print(f"[Cache] Reloaded {ECDICT_FILE} ({len(_EC_CACHE):,})")
 
+def _sync_user_cache():
+    """只套用其他 worker（或本 process）新增的異動；異動紀錄不足時才整份重載"""
+    global _USER_CACHE, _USER_LOADED, _USER_CURSOR, _USER_GEN, _SAMPLER, _WORD_STATS, _USER_KEYS, _WORD_INDEX
+    global _KNOWN_WORDS, _KNOWN_FROZEN
+    store = get_word_store()
+    started = time.perf_counter()
+
+    changes = store.changes_since(_USER_CURSOR) if _USER_LOADED else None
+    if changes is None:
+        _USER_CURSOR = store.change_cursor()
+        items = store.list_words()
+        _USER_CACHE = {item["word"].lower(): item.get("definition", "") for item in items}
+        _KNOWN_WORDS = {item["word"].lower() for item in items if _is_known(item)}
+        _KNOWN_FROZEN = None
+        _USER_LOADED = True
+        _USER_GEN += 1
+        _SAMPLER = _WORD_STATS = _USER_KEYS = _WORD_INDEX = None   # 下次使用時重建
+        metrics.record_reload("words", time.perf_counter() - started)
+        print(f"[Cache] Reloaded words ({len(_USER_CACHE):,})")
+        return
+
+    _USER_CURSOR, changed = changes
+    for word, row in changed.items():
+        if row is None:
+            user_cache_remove(word)
+        else:
+            user_cache_put(word, row.get("definition", ""), row)
+    metrics.record_reload("words_changes", time.perf_counter() - started)
+
+def refresh_caches():
+    """同步 ECDICT / 字彙庫快取
+
+    以共用版本號判斷是否有異動（一次記憶體讀取），只重新載入有變動的資料集。
+    seen 計數不在這裡同步：其他 worker 寫回的計數只在需要時（統計、抽樣表重建、批次新增）才重新合併，
+    避免每次其他 worker 寫回後，所有 request 都要重新讀取整份 seen_words.json。
+    """
+    global _EC_SEEN_GEN, _EC_NEXT_STAT, _USER_SEEN_GEN
+    gens = get_generations()
+
+    # ECDICT
+    ec_gen, now = gens.read(generation.ECDICT), time.monotonic()
+    if ec_gen != _EC_SEEN_GEN or now >= _EC_NEXT_STAT:
+        _EC_SEEN_GEN, _EC_NEXT_STAT = ec_gen, now + ECDICT_STAT_INTERVAL
+        _reload_ecdict()
+
     # WORDS（轉為 word -> definition 的查詢表）
-    if os.path.exists(WORDS_FILE):
-        mtime = os.path.getmtime(WORDS_FILE)
-        if mtime != _USER_MTIME:
-            raw = load_json_file(WORDS_FILE)
-            _USER_CACHE = {item["word"].lower(): item.get("definition", "") for item in raw}
-            _USER_MTIME = mtime
-            print(f"[Cache] Reloaded {WORDS_FILE} ({len(_USER_CACHE):,})")
-
-    # SEEN
-    if os.path.exists(SEEN_WORDS_FILE):
-        mtime = os.path.getmtime(SEEN_WORDS_FILE)
-        if mtime != _SEEN_MTIME:
-            _SEEN_CACHE = load_json_file(SEEN_WORDS_FILE)
-            _SEEN_MTIME = mtime
-            print(f"[Cache] Reloaded {SEEN_WORDS_FILE} ({len(_SEEN_CACHE):,})")
-    
-    
+    words_gen = gens.read(generation.WORDS)
+    if not _USER_LOADED or words_gen != _USER_SEEN_GEN:
+        _USER_SEEN_GEN = words_gen
+        _sync_user_cache()
+
 
 def get_ecdict():
+    """回傳唯讀的 word -> translation 查詢表（EcdictReader 或 dict）"""
     return _EC_CACHE
 
+def get_ecdict_version():
+    """目前字典的版本（共用版本號 + 檔案 mtime），跨 process 與重新啟動都一致，供持久化的衍生資料比對"""
+    return f"{get_generations().read(generation.ECDICT)}:{_EC_MTIME}"
+
 def get_user_words():
     return _USER_CACHE
 
+def get_lookup_indexes():
+    """(ECDICT, 字彙庫) 的排序 key 索引，供前綴 / 模糊查詢
+
+    ecdict.bin 本身已排序，直接使用 EcdictReader；ecdict.json 在每次重載後排序一次。
+    字彙庫的排序 key 隨 user_cache_put / user_cache_remove 逐筆插入或移除。
+    """
+    global _EC_KEYS, _EC_KEYS_GEN, _USER_KEYS
+    from word_lookup import SortedKeys
+
+    if isinstance(_EC_CACHE, EcdictReader):
+        ec_index = _EC_CACHE
+    else:
+        if _EC_KEYS is None or _EC_KEYS_GEN != _EC_GEN:
+            _EC_KEYS, _EC_KEYS_GEN = SortedKeys(_EC_CACHE), _EC_GEN
+        ec_index = _EC_KEYS
+
+    if _USER_KEYS is None:
+        _USER_KEYS = SortedKeys(_USER_CACHE)
+    return ec_index, _USER_KEYS
+
+def get_word_store():
+    """取得字彙庫儲存後端（lazy 建立，每個 process 一份）"""
+    global _WORD_STORE
+    if _WORD_STORE is None:
+        from word_store import open_word_store
+        _WORD_STORE = open_word_store(WORD_STORE_BACKEND)
+    return _WORD_STORE
+
+def get_words_version():
+    """字彙庫的跨 worker 版本號（每次寫入 +1），用於 HTTP ETag"""
+    return get_generations().read(generation.WORDS)
+
+def get_cache_generation():
+    """(ECDICT 版本, 字彙庫版本)"""
+    return _EC_GEN, _USER_GEN
+
+def _is_known(row):
+    return int(row.get("reviewed") or 0) >= KNOWN_MIN_REVIEWED
+
+def _set_known(key, known):
+    global _KNOWN_FROZEN
+    if known != (key in _KNOWN_WORDS):
+        if known:
+            _KNOWN_WORDS.add(key)
+        else:
+            _KNOWN_WORDS.discard(key)
+        _KNOWN_FROZEN = None
+
+def get_known_words():
+    """已熟悉的單字（frozenset），字彙庫有異動時才重新產生"""
+    global _KNOWN_FROZEN
+    known = _KNOWN_FROZEN
+    if known is None:
+        known = _KNOWN_FROZEN = frozenset(_KNOWN_WORDS)
+    return known
+
+def user_cache_put(word, definition, row=None):
+    """word store 寫入後逐筆同步 _USER_CACHE（定義沒變時不更動版本號）
+
+    row 為完整的單字資料時，一併更新抽樣權重與統計。
+    """
+    global _USER_GEN
+    key, definition = word.lower(), definition or ""
+    if _USER_CACHE.get(key) != definition:
+        if _USER_KEYS is not None and key not in _USER_CACHE:
+            _USER_KEYS.add(key)
+        _USER_CACHE[key] = definition
+        _USER_GEN += 1
+    if row is None:
+        return
+    _set_known(key, _is_known(row))
+    if _SAMPLER is not None:
+        # 新單字只取本 process 已知的計數，不為了一個單字重新合併整份 seen_words.json
+        seen = None if row["word"] in _SAMPLER else get_seen_counter().get(row["word"])
+        _SAMPLER.put(row, seen=seen)
+    if _WORD_STATS is not None:
+        _WORD_STATS.put(row)
+    if _WORD_INDEX is not None:
+        _WORD_INDEX.put(row)
+
+def user_cache_remove(word):
+    global _USER_GEN
+    _set_known(word.lower(), False)
+    if _USER_CACHE.pop(word.lower(), None) is not None:
+        _USER_GEN += 1
+        if _USER_KEYS is not None:
+            _USER_KEYS.discard(word.lower())
+    if _SAMPLER is not None:
+        _SAMPLER.remove(word)
+    if _WORD_STATS is not None:
+        _WORD_STATS.remove(word)
+    if _WORD_INDEX is not None:
+        _WORD_INDEX.remove(word)
+
+def get_word_sampler():
+    """/api/random 的加權抽樣表（lazy 建立，之後隨寫入逐筆更新）
+
+    本 process 的 seen 計數即時套用；其他 worker 寫回計數後，最多每 SAMPLER_RESYNC_INTERVAL 秒整份重建一次。
+    本 process 自己寫回造成的版本號改變不需要重建。
+    """
+    global _SAMPLER, _SAMPLER_SEEN_MERGES, _SAMPLER_NEXT_SYNC
+    from word_sampler import WeightedSampler
+
+    counter, now = get_seen_counter(), time.monotonic()
+    stale = (
+        (counter.has_foreign_changes() or counter.merges != _SAMPLER_SEEN_MERGES)
+        and now >= _SAMPLER_NEXT_SYNC
+    )
+    if _SAMPLER is None or stale:
+        started = time.perf_counter()
+        seen = counter.counts()
+        _SAMPLER = WeightedSampler(get_word_store().list_words(), seen)
+        metrics.record_reload("sampler", time.perf_counter() - started)
+        _SAMPLER_SEEN_MERGES, _SAMPLER_NEXT_SYNC = counter.merges, now + SAMPLER_RESYNC_INTERVAL
+    return _SAMPLER
+
+def get_word_stats():
+    """/api/words/stats 的累計統計（lazy 建立，之後隨寫入逐筆更新）"""
+    global _WORD_STATS
+    if _WORD_STATS is None:
+        from word_stats import WordStats
+        started = time.perf_counter()
+        _WORD_STATS = WordStats(get_word_store().iter_words())
+        metrics.record_reload("stats", time.perf_counter() - started)
+    return _WORD_STATS
+
+def get_word_index():
+    """GET /api/words 分頁查詢的排序索引（lazy 建立，之後隨寫入逐筆更新）"""
+    global _WORD_INDEX
+    if _WORD_INDEX is None:
+        from word_query import WordIndex
+        started = time.perf_counter()
+        _WORD_INDEX = WordIndex(get_word_store().iter_words())
+        metrics.record_reload("word_index", time.perf_counter() - started)
+    return _WORD_INDEX
+
+def get_seen_counter():
+    """取得 seen_words 計數器（lazy 建立，啟動時重播殘留的 delta log）"""
+    global _SEEN_COUNTER
+    if _SEEN_COUNTER is None:
+        from seen_counter import SeenCounter
+        _SEEN_COUNTER = SeenCounter(
+            SEEN_WORDS_FILE,
+            flush_interval=SEEN_FLUSH_INTERVAL,
+            flush_threshold=SEEN_FLUSH_THRESHOLD,
+        ).start()
+    return _SEEN_COUNTER
+
 def get_seen_words():
-    return _SEEN_CACHE
+    return get_seen_counter().counts()
 
 def update_seen_words_internal(word_list):
     """
@@ -70,14 +334,12 @@ def update_seen_words_internal(word_list):
     此函式會：
       - 自動過濾空字
       - 小寫化
-      - 將出現次數 +1
-      - 寫回 seen_words.json
+      - 將出現次數 +1（記憶體計數 + delta log，由背景 thread 批次寫回 seen_words.json）
     """
     if not word_list:
         return
 
-    seen = load_json_file(SEEN_WORDS_FILE) or {}
-
+    words = []
     for w in word_list:
         if isinstance(w, str):
             word = w.strip().lower()
@@ -89,12 +351,14 @@ def update_seen_words_internal(word_list):
         if not word:
             continue
 
-        seen[word] = seen.get(word, 0) + 1
+        words.append(word)
 
-    with open(SEEN_WORDS_FILE, "w", encoding="utf-8") as f:
-        json.dump(seen, f, indent=2, ensure_ascii=False)
+    get_seen_counter().add(words)
+    if _SAMPLER is not None:
+        _SAMPLER.add_seen(Counter(words))
 
 def get_setting_file():
+    webhook_url = None
     try:
         with open(SETTING_FILE, "r", encoding="utf-8") as f:
             datas = json.load(f)
@@ -1,20 +1,40 @@
+# convert_cedict_to_json.py
+"""
+ECDICT CSV → ecdict.json / ecdict.bin 轉換工具
+
+- 以串流方式讀取 CSV，每 --chunk-rows 筆交給 process pool 清理翻譯欄位，不需先載入整份 CSV
+- 輸出精簡 JSON（無縮排）或 mmap 二進位格式（ecdict.bin），或兩者皆輸出
+- 來源 CSV 的 sha256 記錄於 <output>.source.json，內容未變時直接略過（--force 強制重建）
+- 完成後 bump 共用版本號，執行中的 worker 會重新載入新字典
+
+    python convert_cedict_to_json.py                          # ecdict.csv → ecdict.json
+    python convert_cedict_to_json.py ecdict.csv --format both # 同時輸出 ecdict.json 與 ecdict.bin
+"""
+import argparse
 import csv
+import hashlib
 import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 
-input_file = "ecdict.csv"      # 原始詞庫檔
-output_file = "ecdict.json"    # 轉換後輸出檔
+DEFAULT_INPUT = "ecdict.csv"       # 原始詞庫檔
+DEFAULT_JSON = "ecdict.json"       # 轉換後輸出檔
+DEFAULT_BIN = "ecdict.bin"
+CHUNK_ROWS = 20000
 
-mapping = {}
 
-with open(input_file, "r", encoding="utf-8") as f:
-    reader = csv.DictReader(f)
-    for row in reader:
+def clean_chunk(rows):
+    """清理一批 (word, translation)；回傳 (保留的 pairs, 略過筆數)"""
+    pairs, skipped = [], 0
+    for word, translation in rows:
         # ECDICT 有時會在欄位值前後帶引號
-        word = row["word"].strip().lower().strip("'").strip('"')
-        translation = row.get("translation", "").strip()
+        word = word.strip().lower().strip("'").strip('"')
+        translation = (translation or "").strip()
 
         # 若 translation 欄位空，則跳過
         if not word or not translation:
+            skipped += 1
             continue
 
         # 清理換行符與多餘空白
@@ -22,9 +42,165 @@ with open(input_file, "r", encoding="utf-8") as f:
         if translation.endswith("；"):
             translation = translation[:-1]
 
-        mapping[word] = translation
+        pairs.append((word, translation))
+    return pairs, skipped
+
+
+def iter_chunks(path, chunk_rows=CHUNK_ROWS):
+    """逐批讀取 CSV 的 (word, translation) 欄位，回傳 generator"""
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.reader(f)
+        header = next(reader, None) or []
+        try:
+            word_col = header.index("word")
+        except ValueError:
+            raise SystemExit(f"{path}: 找不到 word 欄位")
+        trans_col = header.index("translation") if "translation" in header else None
+
+        chunk = []
+        for row in reader:
+            if len(row) <= word_col:
+                continue
+            translation = row[trans_col] if trans_col is not None and trans_col < len(row) else ""
+            chunk.append((row[word_col], translation))
+            if len(chunk) >= chunk_rows:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+
+def _cleaned(chunks, workers):
+    """依原順序回傳清理結果；同時送進 pool 的批次數有上限，記憶體不隨 CSV 大小成長"""
+    if workers <= 1:
+        for chunk in chunks:
+            yield len(chunk), clean_chunk(chunk)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = []
+        for chunk in chunks:
+            pending.append((len(chunk), pool.submit(clean_chunk, chunk)))
+            if len(pending) >= workers * 2:
+                n, fut = pending.pop(0)
+                yield n, fut.result()
+        for n, fut in pending:
+            yield n, fut.result()
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _stamp_path(output):
+    return f"{output}.source.json"
+
+
+def _is_up_to_date(outputs, stamp):
+    for path in outputs:
+        if not os.path.exists(path):
+            return False
+        try:
+            with open(_stamp_path(path), "r", encoding="utf-8") as f:
+                if json.load(f) != stamp:
+                    return False
+        except (OSError, ValueError):
+            return False
+    return True
+
+
+def _write_stamp(output, stamp):
+    with open(_stamp_path(output), "w", encoding="utf-8") as f:
+        json.dump(stamp, f, ensure_ascii=False)
+
+
+def convert(input_path, fmt="json", json_path=DEFAULT_JSON, bin_path=DEFAULT_BIN,
+            workers=None, chunk_rows=CHUNK_ROWS, force=False):
+    """轉換並回傳統計；來源未變時回傳 {"skipped": True, ...}"""
+    workers = workers or os.cpu_count() or 1
+    outputs = ([json_path] if fmt in ("json", "both") else []) + ([bin_path] if fmt in ("bin", "both") else [])
+    timings = {}
+
+    t0 = time.perf_counter()
+    stamp = {"sha256": file_sha256(input_path)}
+    timings["checksum_s"] = time.perf_counter() - t0
+
+    if not force and _is_up_to_date(outputs, stamp):
+        return {"skipped": True, "outputs": outputs, "timings": timings}
+
+    # 讀取 + 清理（同一單字出現多次時以後出現者為準，與舊版行為相同）
+    t0 = time.perf_counter()
+    mapping, rows, skipped = {}, 0, 0
+    for n, (pairs, chunk_skipped) in _cleaned(iter_chunks(input_path, chunk_rows), workers):
+        rows += n
+        skipped += chunk_skipped
+        mapping.update(pairs)
+    timings["parse_s"] = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    sizes = {}
+    if json_path in outputs:
+        from cache import write_json_atomic
+        write_json_atomic(json_path, mapping)
+        sizes[json_path] = os.path.getsize(json_path)
+    if bin_path in outputs:
+        from ecdict_bin import build_ecdict_bin
+        build_ecdict_bin(mapping, bin_path)
+        sizes[bin_path] = os.path.getsize(bin_path)
+    for path in outputs:
+        _write_stamp(path, stamp)
+    timings["write_s"] = time.perf_counter() - t0
+
+    # 通知執行中的 worker 重新載入字典
+    import generation
+    from cache import bump_generation
+    bump_generation(generation.ECDICT)
+
+    return {
+        "skipped": False,
+        "rows": rows,
+        "entries": len(mapping),
+        "empty": skipped,
+        "duplicates": rows - skipped - len(mapping),
+        "outputs": sizes,
+        "workers": workers,
+        "timings": timings,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ECDICT CSV 轉換工具")
+    parser.add_argument("input", nargs="?", default=DEFAULT_INPUT, help="ECDICT CSV（預設 ecdict.csv）")
+    parser.add_argument("--format", choices=("json", "bin", "both"), default="json",
+                        help="json：精簡 JSON；bin：mmap 二進位格式；both：兩者皆輸出")
+    parser.add_argument("--json-output", default=DEFAULT_JSON)
+    parser.add_argument("--bin-output", default=DEFAULT_BIN)
+    parser.add_argument("--workers", type=int, default=None, help="清理用的 process 數（預設 CPU 數）")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--force", action="store_true", help="忽略 checksum，強制重建")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    stats = convert(args.input, args.format, args.json_output, args.bin_output,
+                    workers=args.workers, chunk_rows=args.chunk_rows, force=args.force)
+    elapsed = time.perf_counter() - started
+
+    timing = ", ".join(f"{k[:-2]} {v:.2f}s" for k, v in stats["timings"].items())
+    if stats["skipped"]:
+        print(f"來源未變更，略過轉換（{', '.join(stats['outputs'])}；{timing}）")
+        return stats
+
+    print(f"轉換完成，共 {stats['entries']:,} 條詞彙（讀取 {stats['rows']:,} 列，"
+          f"空白略過 {stats['empty']:,}，重複 {stats['duplicates']:,}）")
+    for path, size in stats["outputs"].items():
+        print(f"  輸出 {path}：{size / 1024 / 1024:.1f} MB")
+    print(f"  耗時 {elapsed:.2f}s（{timing}；workers={stats['workers']}）")
+    return stats
 
-with open(output_file, "w", encoding="utf-8") as f:
-    json.dump(mapping, f, ensure_ascii=False, indent=2)
 
-print(f"轉換完成，共 {len(mapping)} 條詞彙，輸出至 {output_file}")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+# ecdict_bin.py
+"""
+ECDICT 二進位查詢格式（ecdict.bin）
+
+檔案結構（little-endian）：
+    header   : MAGIC(8 bytes) + count(uint32)
+    offsets  : (count + 1) 個 uint32，key 區塊內的起始位置
+    voffsets : (count + 1) 個 uint32，value 區塊內的起始位置
+    keys     : 依 UTF-8 位元組排序後串接的 key
+    values   : 與 key 同順序串接的 UTF-8 翻譯
+
+以 mmap 開啟、二分搜尋查詢，多個 worker 共用同一份 page cache，
+不需要把整本字典載入成 Python dict。
+"""
+import mmap
+import os
+import struct
+import sys
+import json
+from collections.abc import Mapping
+
+MAGIC = b"ECDBIN01"
+_HEADER = struct.Struct("<8sI")
+_U32 = struct.Struct("<I")
+
+
+def build_ecdict_bin(mapping, path):
+    """將 word -> translation 的 dict 寫成 ecdict.bin（先寫暫存檔再 rename）"""
+    items = sorted(
+        (str(k).encode("utf-8"), str(v).encode("utf-8")) for k, v in mapping.items()
+    )
+    count = len(items)
+
+    key_offsets, val_offsets = [0], [0]
+    for k, v in items:
+        key_offsets.append(key_offsets[-1] + len(k))
+        val_offsets.append(val_offsets[-1] + len(v))
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, count))
+        f.write(struct.pack(f"<{count + 1}I", *key_offsets))
+        f.write(struct.pack(f"<{count + 1}I", *val_offsets))
+        for k, _ in items:
+            f.write(k)
+        for _, v in items:
+            f.write(v)
+    os.replace(tmp_path, path)
+    return count
+
+
+class EcdictReader(Mapping):
+    """唯讀、類 dict 的 ecdict.bin 讀取器（支援 get / in / len / 迭代）"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self._count = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            self._mm.close()
+            raise ValueError(f"{path} 不是 ecdict.bin 格式")
+
+        n = self._count + 1
+        self._koff_base = _HEADER.size
+        self._voff_base = self._koff_base + n * _U32.size
+        self._keys_base = self._voff_base + n * _U32.size
+        key_bytes = _U32.unpack_from(self._mm, self._koff_base + self._count * _U32.size)[0]
+        self._vals_base = self._keys_base + key_bytes
+
+    # ----------------------------------------------------
+    # 內部存取
+    # ----------------------------------------------------
+    def _key_bytes(self, i):
+        start, end = struct.unpack_from("<2I", self._mm, self._koff_base + i * _U32.size)
+        return self._mm[self._keys_base + start:self._keys_base + end]
+
+    def _value(self, i):
+        start, end = struct.unpack_from("<2I", self._mm, self._voff_base + i * _U32.size)
+        return self._mm[self._vals_base + start:self._vals_base + end].decode("utf-8")
+
+    def _lower_bound(self, key, lo=0, hi=None):
+        hi = self._count if hi is None else hi
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_bytes(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _index(self, word):
+        if not isinstance(word, str):
+            return -1
+        key = word.encode("utf-8")
+        i = self._lower_bound(key)
+        if i < self._count and self._key_bytes(i) == key:
+            return i
+        return -1
+
+    # ----------------------------------------------------
+    # 排序 key 存取（前綴 / 模糊查詢使用，見 word_lookup.py）
+    # ----------------------------------------------------
+    def key_at(self, i):
+        return self._key_bytes(i).decode("utf-8")
+
+    def value_at(self, i):
+        return self._value(i)
+
+    def lower_bound(self, word, lo=0, hi=None):
+        """[lo, hi) 內第一個 >= word 的 key 索引（UTF-8 位元組順序與 code point 順序相同）"""
+        return self._lower_bound(word.encode("utf-8"), lo, hi)
+
+    # ----------------------------------------------------
+    # Mapping 介面
+    # ----------------------------------------------------
+    def __getitem__(self, word):
+        i = self._index(word)
+        if i < 0:
+            raise KeyError(word)
+        return self._value(i)
+
+    def __contains__(self, word):
+        return self._index(word) >= 0
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        for i in range(self._count):
+            yield self._key_bytes(i).decode("utf-8")
+
+    def close(self):
+        self._mm.close()
+
+
+if __name__ == "__main__":
+    # python ecdict_bin.py ecdict.json ecdict.bin
+    src = sys.argv[1] if len(sys.argv) > 1 else "ecdict.json"
+    dst = sys.argv[2] if len(sys.argv) > 2 else "ecdict.bin"
+    with open(src, "r", encoding="utf-8") as f:
+        total = build_ecdict_bin(json.load(f), dst)
+
+    # 通知執行中的 worker 重新 mmap 新字典
+    import generation
+    from cache import bump_generation
+    bump_generation(generation.ECDICT)
+    print(f"轉換完成，共 {total} 條詞彙，輸出至 {dst}")
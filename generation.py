@@ -0,0 +1,57 @@
+# generation.py
+"""
+跨 worker 的資料版本號（generation counter）
+
+以一個小檔案（每個資料集 8 bytes）mmap 進每個 process：
+- 寫入端每次異動後 bump()，以檔案鎖保證遞增
+- 讀取端 read() 只是一次記憶體讀取，不需要 stat()，也不受 mtime 解析度影響
+"""
+import mmap
+import os
+import struct
+import threading
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# 資料集欄位
+ECDICT = 0
+WORDS = 1
+SEEN = 2
+SLOTS = 8
+
+_U64 = struct.Struct("<Q")
+
+
+class GenerationCounter:
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        size = SLOTS * _U64.size
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            self._mm = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        self._lock_fp = open(f"{path}.lock", "a")
+
+    def read(self, slot):
+        return _U64.unpack_from(self._mm, slot * _U64.size)[0]
+
+    def bump(self, slot):
+        """版本號 +1 並回傳新值"""
+        with self._lock:
+            if fcntl:
+                fcntl.flock(self._lock_fp, fcntl.LOCK_EX)
+            try:
+                value = self.read(slot) + 1
+                _U64.pack_into(self._mm, slot * _U64.size, value)
+            finally:
+                if fcntl:
+                    fcntl.flock(self._lock_fp, fcntl.LOCK_UN)
+        return value
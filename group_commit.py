@@ -0,0 +1,139 @@
+# group_commit.py
+"""
+JSON 檔的單一 writer（group commit）
+
+所有異動都排入同一個 writer thread：
+- writer 取出第一筆後，再等待 window 秒收集同時排入的異動（最多 max_batch 筆）
+- 整批只讀取一次檔案、依序套用每筆異動，再以一次 atomic write（暫存檔 + fsync + rename）寫回
+- 呼叫端取得 Future，寫回完成（或失敗）後才拿到結果，即 commit 確認
+- 異動函式回傳 Unchanged(結果) 表示沒有修改 state；整批都沒有修改時不寫回
+
+並發寫入越多，每次寫檔分攤到的異動越多；同一 process 內不會再有 read-modify-write 互相覆蓋。
+跨 process 的寫入以檔案鎖串行化（與 seen_counter 相同）。
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows：單一 process 使用，不需跨 process 檔案鎖
+    fcntl = None
+
+GROUP_COMMIT_WINDOW = 0.005
+GROUP_COMMIT_MAX_BATCH = 1000
+
+
+class Unchanged:
+    """異動函式的回傳值：沒有修改 state，呼叫端仍拿到 result"""
+    __slots__ = ("result",)
+
+    def __init__(self, result=None):
+        self.result = result
+
+
+class GroupCommitWriter:
+
+    def __init__(self, load, save, lock_path=None, name="group-commit",
+                 window=GROUP_COMMIT_WINDOW, max_batch=GROUP_COMMIT_MAX_BATCH):
+        """
+        load()     ：讀取目前內容（每批一次）
+        save(state)：寫回整份內容，需自行保證 atomic
+        lock_path  ：跨 process 檔案鎖；None 表示只有單一 process 寫入
+        """
+        self.load = load
+        self.save = save
+        self.lock_path = lock_path
+        self.name = name
+        self.window = window
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self.batches = 0
+        self.mutations = 0
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                    self._thread.start()
+
+    def submit(self, mutate):
+        """排入一筆異動 mutate(state) -> 結果（或 Unchanged(結果)）；回傳 Future，寫回完成後才有結果"""
+        future = Future()
+        self._ensure_started()
+        self._queue.put((mutate, future))
+        return future
+
+    def apply(self, mutate, timeout=None):
+        """submit() 並等待 commit 確認；異動或寫回失敗時 raise"""
+        return self.submit(mutate).result(timeout)
+
+    # ----------------------------------------------------
+    # writer thread
+    # ----------------------------------------------------
+    @contextmanager
+    def _file_lock(self):
+        if fcntl is None or self.lock_path is None:
+            yield
+            return
+        with open(self.lock_path, "a") as lock_fp:
+            fcntl.flock(lock_fp, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_fp, fcntl.LOCK_UN)
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                self._commit(batch)
+            except Exception as e:
+                print(f"[GroupCommit] {self.name} write failed: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _commit(self, batch):
+        results = []
+        with self._file_lock():
+            state = self.load()
+            changed = False
+            for mutate, future in batch:
+                # 個別異動失敗只影響該筆；異動函式應在修改 state 之前完成檢查
+                try:
+                    result = mutate(state)
+                except Exception as e:
+                    results.append((future, None, e))
+                    continue
+                if isinstance(result, Unchanged):
+                    result = result.result
+                else:
+                    changed = True
+                results.append((future, result, None))
+            if changed:
+                self.save(state)
+
+        self.batches += 1
+        self.mutations += len(batch)
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
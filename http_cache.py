@@ -0,0 +1,203 @@
+# http_cache.py
+"""
+條件式 GET（ETag / 304）與預先壓縮的回應快取
+
+常被輪詢的大型回應（/api/words、/api/export）以字彙庫版本號產生 strong ETag：
+- If-None-Match 相符時直接回 304，不讀取也不序列化字彙庫
+- 回應內容依 (key, 版本號) 快取，gzip / br 壓縮結果在第一次需要時產生並一併快取
+- 任何寫入都會讓版本號 +1，舊版本的快取整份失效
+
+同一版本不同編碼的內容不同，ETag 加上編碼後綴（"words-12-gzip"）。
+brotli 為可選套件，未安裝時只提供 gzip。
+"""
+import os
+import threading
+import zlib
+from collections import OrderedDict
+
+from flask import Response, request
+
+import metrics
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+RESPONSE_CACHE_MAX_MB = float(os.environ.get("RESPONSE_CACHE_MAX_MB", "64"))
+COMPRESS_MIN_BYTES = 1024   # 太小的回應不值得壓縮
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+TOO_LARGE = object()   # 超過快取上限，呼叫端改用串流輸出
+
+
+def _compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    return compressor.compress(body) + compressor.flush()
+
+
+class ResponseCache:
+    """依 (key, 版本號) 快取回應內容；總量超過 max_bytes 時淘汰最久未使用的 key"""
+
+    def __init__(self, max_mb=RESPONSE_CACHE_MAX_MB):
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> {encoding（None 為原始內容）: bytes} 或 TOO_LARGE
+        self._version = None
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _check_version(self, version):
+        if version != self._version:
+            self._entries.clear()
+            self._bytes = 0
+            self._version = version
+
+    def _make_room(self, nbytes, keep):
+        """淘汰最久未使用的 key（keep 除外），直到可再放入 nbytes；放不下時回傳 False"""
+        for key in list(self._entries):
+            if self._bytes + nbytes <= self.max_bytes:
+                break
+            entry = self._entries[key]
+            if key == keep or entry is TOO_LARGE:
+                continue
+            del self._entries[key]
+            self._bytes -= sum(len(data) for data in entry.values())
+        return self._bytes + nbytes <= self.max_bytes
+
+    def get(self, key, version):
+        """回傳快取的原始內容、TOO_LARGE，或 None（沒有快取）"""
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry if entry is TOO_LARGE else entry[None]
+
+    def encoded(self, key, version, body, encoding):
+        """body 的壓縮結果；第一次需要時壓縮，之後從快取取得（放不下時只回傳、不快取）"""
+        with self._lock:
+            entry = self._entries.get(key) if version == self._version else None
+            if isinstance(entry, dict) and encoding in entry:
+                return entry[encoding]
+
+        data = _compress(body, encoding)
+        with self._lock:
+            # 壓縮期間版本可能已改變、或 entry 已被淘汰，此時不寫回
+            if version == self._version and isinstance(entry, dict) and self._entries.get(key) is entry:
+                if encoding not in entry and self._make_room(len(data), keep=key):
+                    entry[encoding] = data
+                    self._bytes += len(data)
+        return data
+
+    def put(self, key, version, body):
+        """body 為 None 或本身就超過上限時標記為 TOO_LARGE；其他 key 佔用的空間則以淘汰釋出"""
+        with self._lock:
+            self._check_version(version)
+            if key in self._entries:
+                return
+            if body is None or len(body) > self.max_bytes:
+                self._entries[key] = TOO_LARGE
+                return
+            self._make_room(len(body), keep=key)
+            self._entries[key] = {None: body}
+            self._bytes += len(body)
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries), "bytes": self._bytes}
+
+RESPONSE_CACHE = ResponseCache()
+
+
+@metrics.register_collector
+def _response_cache_metrics():
+    stats = RESPONSE_CACHE.stats()
+    return [
+        ("response_cache_requests_total", "counter", "Response cache lookups",
+         [({"result": "hit"}, stats["hits"]), ({"result": "miss"}, stats["misses"])]),
+        ("response_cache_bytes", "gauge", "Cached response bodies (raw + compressed)", [({}, stats["bytes"])]),
+    ]
+
+
+# ============================================================
+# 請求處理
+# ============================================================
+def make_etag(key, version, encoding=None):
+    return f"{key}-{version}" + (f"-{encoding}" if encoding else "")
+
+
+def choose_encoding():
+    """依 Accept-Encoding 選擇壓縮方式：br（已安裝 brotli）> gzip > 不壓縮"""
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        return "br"
+    if accepted["gzip"]:
+        return "gzip"
+    return None
+
+
+def is_not_modified(key, version):
+    """If-None-Match 含本版本任一編碼的 ETag 時為 True"""
+    tags = request.if_none_match
+    if not tags:
+        return False
+    return any(tags.contains_weak(make_etag(key, version, e)) for e in (None, "gzip", "br"))
+
+
+def with_etag(response, key, version, encoding=None):
+    response.set_etag(make_etag(key, version, encoding))
+    response.headers["Cache-Control"] = "no-cache"
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+def not_modified_response(key, version, encoding=None):
+    return with_etag(Response(status=304), key, version, encoding)
+
+
+def cached_response(key, version, build, mimetype, headers=None, compress=True):
+    """
+    以快取內容回應，支援 304；沒有快取時呼叫 build() 產生內容（bytes，超過上限時回傳 None）
+
+    內容本身超過快取上限時回傳 None，呼叫端需改用不經快取的輸出方式（串流或直接序列化）。
+    """
+    encoding = choose_encoding() if compress else None
+    if is_not_modified(key, version):
+        return not_modified_response(key, version, encoding)
+
+    body = RESPONSE_CACHE.get(key, version)
+    if body is None:
+        body = build()
+        RESPONSE_CACHE.put(key, version, body)
+    if body is None or body is TOO_LARGE:
+        return None
+
+    if encoding and len(body) >= COMPRESS_MIN_BYTES:
+        body = RESPONSE_CACHE.encoded(key, version, body, encoding)
+    else:
+        encoding = None
+
+    response = Response(body, mimetype=mimetype, headers=headers)
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    return with_etag(response, key, version, encoding)
+
+
+def collect_limited(chunks, max_bytes=None):
+    """把 bytes chunks 接成一份；超過快取上限時放棄並回傳 None"""
+    max_bytes = RESPONSE_CACHE.max_bytes if max_bytes is None else max_bytes
+    parts, size = [], 0
+    for chunk in chunks:
+        size += len(chunk)
+        if size > max_bytes:
+            return None
+        parts.append(chunk)
+    return b"".join(parts)
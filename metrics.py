@@ -0,0 +1,198 @@
+# metrics.py
+"""
+內建 Prometheus 格式指標（GET /metrics）
+
+- http_request_duration_seconds：每個 blueprint / route 的延遲分布
+- cache_reloads_total / cache_reload_duration_seconds：ECDICT、字彙庫、seen_words 的重新載入
+- file_io_bytes_total：主要 JSON 檔的讀寫量
+- 其他模組可以 register_collector() 在輸出時提供即時數值（例如解析快取命中率）
+
+不依賴 prometheus_client；每次記錄只是一次 dict 查詢與加法。
+指標為每個 process 各自累計，多 worker 部署時由 Prometheus 分別抓取後加總。
+串流回應（匯出、SSE）的延遲只計算到回應開始傳送為止。
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from flask import Response, g, request
+
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") != "0"
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_REGISTRY = []
+_COLLECTORS = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _format_value(v):
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Counter:
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Histogram:
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}   # labels -> [各 bucket 計數..., +Inf 計數, sum]
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def observe(self, value, *labels):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            entry[i] += 1
+            entry[-1] += value
+
+    def collect(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            items = sorted((labels, list(entry)) for labels, entry in self._values.items())
+        for labels, entry in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), entry):
+                cumulative += n
+                le = _format_labels(self.labelnames, labels, [("le", _format_value(float(bound)))])
+                yield f"{self.name}_bucket{le} {cumulative}"
+            base = _format_labels(self.labelnames, labels)
+            yield f"{self.name}_sum{base} {_format_value(entry[-1])}"
+            yield f"{self.name}_count{base} {cumulative}"
+
+
+def register_collector(fn):
+    """fn() 回傳 [(name, type, help, [(labels dict, value), ...]), ...]，輸出 /metrics 時呼叫"""
+    _COLLECTORS.append(fn)
+    return fn
+
+
+def render():
+    lines = []
+    for metric in _REGISTRY:
+        lines.extend(metric.collect())
+    for fn in _COLLECTORS:
+        try:
+            families = fn()
+        except Exception as e:
+            print(f"[Metrics] collector failed: {e}")
+            continue
+        for name, kind, documentation, samples in families:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(list(labels), list(labels.values()))} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# ============================================================
+# 指標定義
+# ============================================================
+HTTP_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP request latency",
+    ("blueprint", "route", "method", "status"),
+)
+CACHE_RELOADS = Counter("cache_reloads_total", "Full cache reloads", ("dataset",))
+CACHE_RELOAD_DURATION = Histogram(
+    "cache_reload_duration_seconds", "Time spent reloading a cache", ("dataset",),
+)
+FILE_IO_BYTES = Counter("file_io_bytes_total", "Bytes read from / written to data files", ("file", "op"))
+PROCESS_START = time.time()
+
+
+def record_reload(dataset, seconds):
+    if METRICS_ENABLED:
+        CACHE_RELOADS.inc(dataset)
+        CACHE_RELOAD_DURATION.observe(seconds, dataset)
+
+
+def record_io(file, op, nbytes):
+    if METRICS_ENABLED and nbytes:
+        FILE_IO_BYTES.inc(file, op, amount=nbytes)
+
+
+@register_collector
+def _process_metrics():
+    return [("process_start_time_seconds", "gauge", "Process start time", [({}, PROCESS_START)])]
+
+
+# ============================================================
+# Flask 整合
+# ============================================================
+def _before_request():
+    g._metrics_start = time.perf_counter()
+
+
+def _observe_request(status):
+    start = g.pop("_metrics_start", None)
+    if start is not None:
+        rule = request.url_rule.rule if request.url_rule else "<unmatched>"
+        HTTP_DURATION.observe(
+            time.perf_counter() - start,
+            request.blueprint or "", rule, request.method, str(status),
+        )
+
+
+def _after_request(response):
+    _observe_request(response.status_code)
+    return response
+
+
+def _teardown_request(exc):
+    # 未處理的例外不會經過 after_request，在此以 500 記錄
+    if exc is not None:
+        _observe_request(500)
+
+
+def init_metrics(app):
+    """註冊 request 計時 hook 與 /metrics endpoint（METRICS_ENABLED=0 時不啟用）"""
+    if not METRICS_ENABLED:
+        return
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        return Response(render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
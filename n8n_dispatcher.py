@@ -0,0 +1,206 @@
+# n8n_dispatcher.py
+"""
+n8n webhook 背景派送
+
+- SqliteJobStore：job 狀態表，具 TTL 與筆數上限；存於 SQLite，多個 gunicorn worker 共用
+                 （callback 與查詢落在不同 worker 也能看到）
+- N8nDispatcher：以背景 thread + 共用 requests.Session（連線池）呼叫 webhook，
+                 失敗時以指數退避重試，同時派送數受 worker 數限制
+
+/api/trigger 只需把 job 放進佇列即可回應，不必佔住 request thread 等待 n8n。
+webhook URL 與 session 皆可由參數指定，方便對本機 stub server 測試。
+"""
+import json
+import queue
+import random
+import sqlite3
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+TERMINAL_STATUS = {"done", "failed"}
+
+
+class SqliteJobStore:
+    """
+    job 狀態表，具 TTL 與筆數上限
+
+    等待狀態改變（long-poll / SSE）時，同一 process 內的寫入以 Condition 立即喚醒；
+    其他 worker 的寫入則每 poll_interval 秒檢查一次。
+    """
+    PURGE_EVERY = 100   # 每寫入 N 次清理一次過期 / 超量的 job
+    poll_interval = 0.25
+
+    def __init__(self, path, ttl=3600, max_jobs=10000):
+        self.path = path
+        self.ttl = ttl
+        self.max_jobs = max_jobs
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id     TEXT PRIMARY KEY,
+                data       TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS jobs_updated_at ON jobs (updated_at);
+        """)
+        self._changed = threading.Condition()
+
+    def _notify(self):
+        with self._changed:
+            self._changed.notify_all()
+
+    def _write_locked(self, job_id, data, now):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO jobs (job_id, data, expires_at, updated_at) VALUES (?, ?, ?, ?)",
+            (job_id, json.dumps(data, ensure_ascii=False), now + self.ttl, now),
+        )
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            self._conn.execute("DELETE FROM jobs WHERE expires_at <= ?", (now,))
+            self._conn.execute(
+                """DELETE FROM jobs WHERE job_id IN (
+                       SELECT job_id FROM jobs ORDER BY updated_at DESC LIMIT -1 OFFSET ?)""",
+                (self.max_jobs,),
+            )
+
+    def set(self, job_id, data):
+        with self._lock:
+            self._write_locked(job_id, data, time.time())
+        self._notify()
+
+    def update(self, job_id, expect_status=None, **fields):
+        """讀取 + 合併 + 寫回在同一個交易內完成，避免與其他 worker 互相覆蓋；
+        指定 expect_status 時，只有目前狀態相符才寫入"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT data FROM jobs WHERE job_id = ? AND expires_at > ?", (job_id, now)
+                ).fetchone()
+                data = json.loads(row[0]) if row else {}
+                if not expect_status or data.get("status") == expect_status:
+                    data.update(fields)
+                    self._write_locked(job_id, data, now)
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        self._notify()
+        return data
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM jobs WHERE job_id = ? AND expires_at > ?", (job_id, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+
+    def wait_for_change(self, job_id, last_status=None, timeout=30):
+        """回傳 (status, data)：狀態與 last_status 不同、或逾時時回傳目前狀態"""
+        deadline = time.monotonic() + timeout
+        while True:
+            data = self.get(job_id)
+            status = data.get("status", "pending") if data else "pending"
+            remaining = deadline - time.monotonic()
+            if status != last_status or remaining <= 0:
+                return status, data
+            with self._changed:
+                self._changed.wait(min(remaining, self.poll_interval))
+
+
+class N8nDispatcher:
+
+    def __init__(self, url, job_store, session=None, workers=4, max_queue=1000,
+                 max_retries=3, backoff=0.5, timeout=10):
+        self.url = url
+        self.job_store = job_store
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+        self.session = session
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._threads = []
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._run, name=f"n8n-dispatch-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, job_id, payload):
+        """放入派送佇列；佇列已滿時拋出 queue.Full"""
+        self._ensure_started()
+        self.job_store.set(job_id, {"status": "queued"})
+        try:
+            self._queue.put_nowait((job_id, payload))
+        except queue.Full:
+            self.job_store.update(job_id, expect_status="queued", status="failed", detail="dispatch queue full")
+            raise
+
+    def _run(self):
+        while True:
+            job_id, payload = self._queue.get()
+            try:
+                self._dispatch(job_id, payload)
+            except Exception as e:
+                # callback 可能已先抵達（done），不可覆蓋
+                self.job_store.update(job_id, expect_status="queued", status="failed", detail=str(e))
+            finally:
+                self._queue.task_done()
+
+    def _dispatch(self, job_id, payload):
+        if not self.url:
+            raise RuntimeError("N8N_WEBHOOK_URL not configured")
+
+        # 重試時 n8n 可能已收到先前的請求（5xx、連線在回應前中斷），以 Idempotency-Key 讓 workflow 去重
+        headers = {"Idempotency-Key": job_id}
+        for attempt in range(self.max_retries + 1):
+            error = None
+            try:
+                r = self.session.post(self.url, json=payload, headers=headers, timeout=self.timeout)
+                if r.status_code not in RETRY_STATUS:
+                    r.raise_for_status()
+                    # 已送達 n8n，等待 /api/n8n_callback 回填結果（callback 可能已先抵達）
+                    self.job_store.update(job_id, expect_status="queued", status="pending")
+                    return
+                error = f"HTTP {r.status_code}"
+            except requests.ConnectionError as e:
+                # 含 ConnectTimeout；ReadTimeout 表示請求已送出、n8n 可能仍在處理，不重送
+                error = str(e)
+
+            if attempt < self.max_retries:
+                delay = self.backoff * (2 ** attempt)
+                time.sleep(delay + random.uniform(0, delay / 2))
+
+        raise RuntimeError(f"webhook failed after {self.max_retries + 1} attempts: {error}")
+
+    def join(self):
+        """等待佇列清空（測試用）"""
+        self._queue.join()
@@ -0,0 +1,79 @@
+# parse_cache.py
+"""
+解析結果的 LRU 快取
+
+以文章內容的 hash 為 key，快取 /api/parse 的輸出；容量以 MB 為上限（估算值）。
+ECDICT 或字彙庫版本（cache.get_cache_generation）改變時整份失效。
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+_ENTRY_OVERHEAD = 200   # 每筆快取的固定開銷估計（bytes）
+_ITEM_OVERHEAD = 120    # 每個 {"word", "zh"} dict 的開銷估計（bytes）
+
+
+def _estimate_size(result):
+    return _ENTRY_OVERHEAD + sum(
+        _ITEM_OVERHEAD + 2 * (len(item["word"]) + len(item["zh"])) for item in result
+    )
+
+
+class ParseCache:
+
+    def __init__(self, max_mb=32):
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> (result, size)
+        self._generation = None
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(text):
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+    def _check_generation(self, generation):
+        if generation != self._generation:
+            self._entries.clear()
+            self._bytes = 0
+            self._generation = generation
+
+    def get(self, key, generation):
+        with self._lock:
+            self._check_generation(generation)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, generation, result):
+        size = _estimate_size(result)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._check_generation(generation)
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (result, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
@@ -0,0 +1,268 @@
+# seen_counter.py
+"""
+seen_words.json 的 write-behind 計數器
+
+- add()    ：只更新記憶體中的計數並 append 一行 delta log，成本 O(len(word_list))
+- flush()  ：累積超過門檻或定時由背景 thread 合併寫回 seen_words.json（暫存檔 + rename）
+- 啟動時會重播上次未寫回的 delta log（crash 後不遺失計數），程式結束時由 atexit 寫回
+
+多個 worker 各自擁有 seen_words.json.<pid>.delta，寫回時以檔案鎖串行化，
+並以「磁碟內容 + 本 process 尚未寫回的增量」合併，不會覆蓋其他 worker 的計數。
+"""
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+import cache
+import generation
+import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows：單一 process 使用，不需跨 process 檔案鎖
+    fcntl = None
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+class SeenCounter:
+
+    def __init__(self, path, flush_interval=5.0, flush_threshold=2000):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+
+        self._lock = threading.RLock()
+        self._pending = Counter()
+        self._flushing = Counter()  # 已從 pending 取出、正在寫回磁碟的增量
+        self._flush_lock = threading.Lock()
+        self._counts = {}
+        self._total = 0    # 所有單字的出現次數總和
+        self._gen = None   # 已合併的共用版本號，其他 worker 寫回後會改變
+        self.merges = 0    # 重新合併磁碟內容（含其他 worker 寫回的計數）的次數
+        self._delta_path = f"{path}.{os.getpid()}.delta"
+        self._flushing_path = f"{path}.{os.getpid()}.flushing.delta"
+        self._delta_fp = None
+        self._wake = threading.Event()
+        self._thread = None
+
+    # ----------------------------------------------------
+    # 啟動 / 關閉
+    # ----------------------------------------------------
+    def start(self):
+        """重播殘留的 delta log、載入計數並啟動背景寫回 thread"""
+        self._replay_orphans()
+        with self._lock:
+            self._reload()
+        self._thread = threading.Thread(target=self._run, name="seen-flush", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+        return self
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            if self._delta_fp:
+                self._delta_fp.close()
+                self._delta_fp = None
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[Seen] flush failed: {e}")
+
+    # ----------------------------------------------------
+    # 磁碟存取
+    # ----------------------------------------------------
+    @contextmanager
+    def _file_lock(self):
+        if fcntl is None:
+            yield
+            return
+        with open(f"{self.path}.lock", "a") as lock_fp:
+            fcntl.flock(lock_fp, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_fp, fcntl.LOCK_UN)
+
+    def _read_disk(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                metrics.record_io(os.path.basename(self.path), "read", os.fstat(f.fileno()).st_size)
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def _write_disk(self, seen):
+        cache.write_json_atomic(self.path, seen)
+        return cache.bump_generation(generation.SEEN)
+
+    def _read_gen(self):
+        return cache.get_generations().read(generation.SEEN)
+
+    def _reload(self):
+        """以磁碟內容 + 本 process 尚未寫回的增量重建記憶體計數"""
+        started = time.perf_counter()
+        self._gen = self._read_gen()
+        counts = self._read_disk()
+        for delta in (self._flushing, self._pending):
+            for word, n in delta.items():
+                counts[word] = counts.get(word, 0) + n
+        self._counts = counts
+        self._total = sum(counts.values())
+        self.merges += 1
+        metrics.record_reload("seen", time.perf_counter() - started)
+
+    def _replay_orphans(self):
+        """合併已結束 process（含自己上次執行）留下的 delta log"""
+        own_pid = os.getpid()
+        with self._file_lock():
+            orphans = []
+            for delta_path in glob.glob(f"{glob.escape(self.path)}.*.delta"):
+                try:
+                    pid = int(delta_path[len(self.path) + 1:].split(".")[0])
+                except ValueError:
+                    continue
+                if pid == own_pid or not _pid_alive(pid):
+                    orphans.append(delta_path)
+            if not orphans:
+                return
+
+            seen = self._read_disk()
+            replayed = 0
+            for delta_path in orphans:
+                with open(delta_path, "r", encoding="utf-8") as f:
+                    for line in f:
+                        try:
+                            delta = json.loads(line)
+                        except ValueError:
+                            continue  # crash 時最後一行可能不完整
+                        for word, n in delta.items():
+                            seen[word] = seen.get(word, 0) + n
+                        replayed += 1
+            self._write_disk(seen)
+            for delta_path in orphans:
+                os.remove(delta_path)
+        print(f"[Seen] Replayed {replayed:,} delta entries from {len(orphans)} log(s)")
+
+    # ----------------------------------------------------
+    # 公開介面
+    # ----------------------------------------------------
+    def add(self, words):
+        """words 為已正規化的單字 list，每個出現一次計數 +1"""
+        delta = Counter(words)
+        if not delta:
+            return
+        with self._lock:
+            if self._delta_fp is None:
+                self._delta_fp = open(self._delta_path, "a", encoding="utf-8")
+            line = json.dumps(delta, ensure_ascii=False) + "\n"
+            self._delta_fp.write(line)
+            self._delta_fp.flush()
+            metrics.record_io("seen_words.delta", "write", len(line))
+
+            self._pending.update(delta)
+            for word, n in delta.items():
+                self._counts[word] = self._counts.get(word, 0) + n
+            self._total += len(words)
+            if len(self._pending) >= self.flush_threshold:
+                self._wake.set()
+
+    def _rotate_delta_log(self):
+        """把 delta log 移到 flushing log；上次寫回失敗留下的 flushing log 不覆蓋，改為接在後面"""
+        if not os.path.exists(self._flushing_path):
+            os.replace(self._delta_path, self._flushing_path)
+            return
+        with open(self._delta_path, "rb") as src, open(self._flushing_path, "ab") as dst:
+            for block in iter(lambda: src.read(1 << 20), b""):
+                dst.write(block)
+            dst.flush()
+            os.fsync(dst.fileno())
+        os.remove(self._delta_path)
+
+    def flush(self):
+        """將尚未寫回的增量合併進 seen_words.json
+
+        先在鎖內把 pending 與 delta log 換下來，寫檔期間 add() 不會被阻塞；
+        寫回完成後才刪除換下來的 delta log。
+        寫回失敗時增量併回 pending，換下來的 delta log 保留在磁碟上，下次寫回時接續 append。
+        """
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return
+                self._flushing, self._pending = self._pending, Counter()
+                if self._delta_fp:
+                    self._delta_fp.close()
+                    self._delta_fp = None
+                    self._rotate_delta_log()
+
+            try:
+                with self._file_lock():
+                    seen = self._read_disk()
+                    for word, n in self._flushing.items():
+                        seen[word] = seen.get(word, 0) + n
+                    gen = self._write_disk(seen)
+            except Exception:
+                with self._lock:
+                    self._pending.update(self._flushing)
+                    self._flushing = Counter()
+                raise
+            total = sum(seen.values())
+
+            with self._lock:
+                if os.path.exists(self._flushing_path):
+                    os.remove(self._flushing_path)
+                self._flushing = Counter()
+                for word, n in self._pending.items():
+                    seen[word] = seen.get(word, 0) + n
+                    total += n
+                self._counts = seen
+                self._total = total
+                # 寫回期間若有其他 worker 也寫回，版本號會多於本次 +1，下次 counts() 會重新合併
+                if self._gen is not None and gen == self._gen + 1:
+                    self._gen = gen
+
+    def counts(self):
+        """目前的計數（其他 worker 寫回後會重新合併）"""
+        with self._lock:
+            if self._read_gen() != self._gen:
+                self._reload()
+            return self._counts
+
+    def has_foreign_changes(self):
+        """其他 worker 是否有尚未合併的寫回（本 process 自己的寫回不算）"""
+        with self._lock:
+            return self._read_gen() != self._gen
+
+    def get(self, word):
+        """本 process 目前已知的計數（不重新合併其他 worker 的寫回）"""
+        with self._lock:
+            return self._counts.get(word, 0)
+
+    def total(self):
+        """所有單字的出現次數總和"""
+        with self._lock:
+            self.counts()
+            return self._total
+
+    def pending_size(self):
+        return len(self._pending)
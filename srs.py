@@ -0,0 +1,70 @@
+# srs.py
+"""
+間隔重複（SM-2）排程
+
+每個單字保存 ease（難易係數）、interval（間隔天數）、reps（連續答對次數）與 due_at（下次複習時間，epoch 秒）。
+quality 為 0–5 的自評分數：< 3 視為忘記，重新從短間隔開始。
+"""
+import time
+
+DAY = 86400
+DEFAULT_EASE = 2.5
+MIN_EASE = 1.3
+RELEARN_DELAY = 600          # 忘記的單字 10 分鐘後再複習
+MAX_INTERVAL = 365           # 間隔上限（天）
+MAX_INITIAL_INTERVAL = 60    # 由 reviewed 推估的初始間隔上限（天），避免沒真正複習過的單字被排到很久以後
+
+# 舊版 API 只有 remembered 布林值，對應到的 quality
+QUALITY_REMEMBERED = 4
+QUALITY_FORGOTTEN = 1
+
+
+def _next_interval(reps, interval, ease):
+    if reps == 1:
+        return 1
+    if reps == 2:
+        return 6
+    return min(round(interval * ease, 2), MAX_INTERVAL)
+
+
+def initial_schedule(reviewed=0, count=0, now=None):
+    """
+    由既有的 reviewed / count 推估初始排程：
+    - reviewed 視為連續答對次數，依 SM-2 推算目前間隔（最多到 MAX_INITIAL_INTERVAL 天）
+    - count 明顯多於 reviewed（常查卻記不住）時調低 ease
+    - 從未複習的單字立即到期，count 越高越優先；已複習過的單字假設已經過半個間隔
+    """
+    now = time.time() if now is None else now
+    reviewed, count = max(int(reviewed or 0), 0), max(int(count or 0), 0)
+
+    ease = max(MIN_EASE, DEFAULT_EASE - 0.1 * max(0, count - reviewed - 1))
+    interval = 0
+    for reps in range(1, reviewed + 1):
+        interval = _next_interval(reps, interval, ease)
+        if interval >= MAX_INITIAL_INTERVAL:
+            interval = MAX_INITIAL_INTERVAL
+            break
+
+    if reviewed == 0:
+        due_at = now - count
+    else:
+        due_at = now + interval * DAY / 2
+    return {"ease": round(ease, 2), "interval": interval, "reps": reviewed, "due_at": due_at}
+
+
+def next_schedule(state, quality, now=None):
+    """依本次 quality 計算下一次排程（SM-2）"""
+    now = time.time() if now is None else now
+    quality = min(max(int(quality), 0), 5)
+    ease, interval, reps = state["ease"], state["interval"], state["reps"]
+
+    if quality < 3:
+        reps, interval = 0, 0
+        due_at = now + RELEARN_DELAY
+    else:
+        reps += 1
+        interval = _next_interval(reps, interval, ease)
+        due_at = now + interval * DAY
+
+    ease = max(MIN_EASE, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    return {"ease": round(ease, 2), "interval": interval, "reps": reps, "due_at": due_at}
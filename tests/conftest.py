@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 各模組位於專案根目錄（沒有 package），測試時加入 import 路徑
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
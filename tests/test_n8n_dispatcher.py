@@ -0,0 +1,142 @@
+"""
+N8nDispatcher 對本機 stub webhook server 的測試：重試 / 退避、已完成的 job 不被覆蓋、逾時不重送
+"""
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from n8n_dispatcher import N8nDispatcher, SqliteJobStore
+
+
+class StubWebhook:
+    """依序回應 script 中的動作：HTTP 狀態碼、("sleep", 秒數)、或 callable(job_id) -> 狀態碼"""
+
+    def __init__(self):
+        self.script = []
+        self.requests = []   # (monotonic 時間, headers, payload)
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                stub.requests.append((time.monotonic(), dict(self.headers), payload))
+                action = stub.script.pop(0) if stub.script else 200
+                if isinstance(action, tuple):
+                    time.sleep(action[1])
+                    action = 200
+                elif callable(action):
+                    action = action(payload["job_id"])
+                self.send_response(action)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/webhook"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub():
+    server = StubWebhook()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SqliteJobStore(str(tmp_path / "jobs.db"))
+
+
+def make_dispatcher(url, store, **kwargs):
+    kwargs.setdefault("workers", 1)
+    kwargs.setdefault("max_retries", 3)
+    kwargs.setdefault("backoff", 0.05)
+    kwargs.setdefault("timeout", 2)
+    return N8nDispatcher(url, store, **kwargs)
+
+
+def dispatch(dispatcher, job_id="job-1"):
+    dispatcher.submit(job_id, {"job_id": job_id})
+    dispatcher.join()
+    return dispatcher.job_store.get(job_id)
+
+
+def test_retries_with_backoff_until_delivered(stub, store):
+    stub.script = [503, 502, 200]
+    job = dispatch(make_dispatcher(stub.url, store))
+
+    assert job["status"] == "pending"
+    assert len(stub.requests) == 3
+    # 退避時間逐次加倍：0.05s、0.1s（加上最多一半的 jitter）
+    gaps = [b[0] - a[0] for a, b in zip(stub.requests, stub.requests[1:])]
+    assert 0.05 <= gaps[0] < 0.1
+    assert 0.1 <= gaps[1] < 0.2
+    assert {r[1]["Idempotency-Key"] for r in stub.requests} == {"job-1"}
+
+
+def test_fails_after_max_retries(stub, store):
+    stub.script = [500] * 10
+    job = dispatch(make_dispatcher(stub.url, store, max_retries=2))
+
+    assert job["status"] == "failed"
+    assert "HTTP 500" in job["detail"]
+    assert len(stub.requests) == 3
+
+
+def test_client_error_is_not_retried(stub, store):
+    stub.script = [400]
+    job = dispatch(make_dispatcher(stub.url, store))
+
+    assert job["status"] == "failed"
+    assert len(stub.requests) == 1
+
+
+@pytest.mark.parametrize("final_status", [200, 500])
+def test_done_job_is_not_overwritten(stub, store, final_status):
+    # n8n 在回應 webhook 之前就先呼叫了 /api/n8n_callback
+    def callback_first(job_id):
+        store.set(job_id, {"status": "done", "words": []})
+        return final_status
+
+    stub.script = [callback_first] + [final_status] * 3
+    job = dispatch(make_dispatcher(stub.url, store))
+
+    assert job == {"status": "done", "words": []}
+
+
+def test_read_timeout_is_not_resent(stub, store):
+    stub.script = [("sleep", 1.0)]
+    job = dispatch(make_dispatcher(stub.url, store, timeout=0.2))
+
+    assert job["status"] == "failed"
+    time.sleep(0.9)   # 等 stub 處理完，確認沒有第二次請求
+    assert len(stub.requests) == 1
+
+
+def test_connection_error_is_retried(store):
+    # 取得一個沒有人 listen 的 port：連線被拒，請求尚未送出，可以安全重試
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    dispatcher = make_dispatcher(f"http://127.0.0.1:{port}/webhook", store, max_retries=2, backoff=0.01)
+    calls = []
+    post = dispatcher.session.post
+    dispatcher.session.post = lambda *a, **kw: calls.append(1) or post(*a, **kw)
+
+    job = dispatch(dispatcher)
+
+    assert job["status"] == "failed"
+    assert "after 3 attempts" in job["detail"]
+    assert len(calls) == 3
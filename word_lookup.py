@@ -0,0 +1,118 @@
+# word_lookup.py
+"""
+單字查詢：完全比對 / 前綴 / 模糊（編輯距離）
+
+查詢對象是「排序後的 key 陣列」，只需要 len()、key_at(i)、lower_bound(word) 三個操作：
+- EcdictReader（ecdict.bin）本身就是依 key 排序，直接在 mmap 上二分搜尋
+- ecdict.json / 使用者字彙以 SortedKeys（排序後的 list）包裝
+
+前綴查詢是兩次二分搜尋；模糊查詢把排序陣列當作 trie 走訪：
+同一前綴的 key 在陣列中相鄰，子節點範圍以 lower_bound 求得，
+並以 Levenshtein DP 的最小值剪枝（超過距離上限的分支不再往下走）、依最小值優先展開。
+"""
+import heapq
+from bisect import bisect_left
+
+MAX_DISTANCE = 2
+FUZZY_MAX_NODES = 500
+
+
+class SortedKeys:
+    """排序後的 key list，提供與 EcdictReader 相同的查詢介面"""
+
+    def __init__(self, keys=()):
+        self._keys = sorted(keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def key_at(self, i):
+        return self._keys[i]
+
+    def lower_bound(self, word, lo=0, hi=None):
+        return bisect_left(self._keys, word, lo, len(self._keys) if hi is None else hi)
+
+    def add(self, key):
+        i = bisect_left(self._keys, key)
+        if i == len(self._keys) or self._keys[i] != key:
+            self._keys.insert(i, key)
+
+    def discard(self, key):
+        i = bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            del self._keys[i]
+
+
+def _next_key(prefix):
+    """所有以 prefix 開頭的字串都 < _next_key(prefix)"""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def prefix_range(index, prefix):
+    """以 prefix 開頭的 key 在 index 中的範圍 [lo, hi)"""
+    if not prefix:
+        return 0, len(index)
+    return index.lower_bound(prefix), index.lower_bound(_next_key(prefix))
+
+
+def exact(index, word):
+    i = index.lower_bound(word)
+    return i < len(index) and index.key_at(i) == word
+
+
+def prefix_search(index, prefix, limit=10):
+    lo, hi = prefix_range(index, prefix)
+    return [index.key_at(i) for i in range(lo, min(hi, lo + limit))]
+
+
+def fuzzy_search(index, word, max_distance=MAX_DISTANCE, limit=10, anchor=1, max_nodes=FUZZY_MAX_NODES):
+    """
+    編輯距離 <= max_distance 的 key，依 (距離, key) 排序：[(distance, key), ...]
+
+    anchor   ：前 N 個字元必須相同（拼錯通常不在字首），只走訪該前綴下的子樹；0 表示搜尋整個字典
+    max_nodes：最多走訪的節點數，避免短字串在大字典上耗時過久（超過時回傳目前找到的結果）
+    """
+    anchor = min(anchor, len(word))
+    head = word[:anchor]
+    lo, hi = prefix_range(index, head)
+
+    found = []
+    # 前綴部分完全相同，DP 列直接由 anchor 位置開始
+    first_row = [abs(k - anchor) for k in range(len(word) + 1)]
+    # best-first：優先展開目前距離最小的節點，節點數用完時已找到的多半是最接近的結果
+    # heap 元素：(DP 列最小值, 序號, lo, hi, prefix, DP 列)；[lo, hi) 內的 key 都以 prefix 開頭
+    heap = [(0, 0, lo, hi, head, first_row)]
+    seq = visited = 0
+
+    while heap and visited < max_nodes:
+        _, _, lo, hi, prefix, row = heapq.heappop(heap)
+        depth = len(prefix)
+        visited += 1
+
+        i = lo
+        if i < hi and len(index.key_at(i)) == depth:
+            # 範圍內最短的 key 恰好等於 prefix（排序後必在最前面）
+            if row[-1] <= max_distance:
+                found.append((row[-1], prefix))
+            i += 1
+
+        while i < hi:
+            child = index.key_at(i)[:depth + 1]
+            j = index.lower_bound(_next_key(child), i, hi)
+            c = child[-1]
+
+            new_row = [row[0] + 1]
+            for k in range(1, len(row)):
+                new_row.append(min(
+                    new_row[k - 1] + 1,
+                    row[k] + 1,
+                    row[k - 1] + (word[k - 1] != c),
+                ))
+            best = min(new_row)
+            if best <= max_distance:
+                seq += 1
+                heapq.heappush(heap, (best, seq, i, j, child, new_row))
+            i = j
+
+    found.sort()
+    return found[:limit]
@@ -0,0 +1,155 @@
+# word_query.py
+"""
+GET /api/words 的分頁查詢
+
+以記憶體內的排序索引支援 keyset 分頁，每頁的成本與頁面大小成正比，而不是字彙庫大小：
+- 每個可排序欄位維護一份排序後的 list（word 為 [word]，其他為 [(值, word)]），
+  單字新增 / 更新 / 刪除時以 bisect 逐筆插入或移除
+- 下一頁由 cursor（上一頁最後一筆的排序鍵）二分搜尋定位，不需要 OFFSET；
+  cursor 以 urlsafe base64 編碼，非 ASCII 的單字也能放進 header
+- 排序欄位本身的條件（word 前綴、count / reviewed 範圍）直接縮小搜尋範圍；
+  依其他欄位排序但有前綴條件時，若前綴範圍較小，改為取出該範圍的單字後排序
+- 其餘條件（added_by 等）在走訪時逐筆判斷
+"""
+import base64
+import threading
+from bisect import bisect_left, bisect_right, insort
+
+SORT_FIELDS = ("word", "count", "reviewed", "added_at")
+RANGE_FIELDS = ("count", "reviewed")
+
+
+def _next_key(prefix):
+    """所有以 prefix 開頭的字串都 < _next_key(prefix)"""
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def _sort_entry(field, row):
+    if field == "word":
+        return row["word"]
+    return (int(row.get(field) or 0), row["word"])
+
+
+def format_cursor(sort, entry):
+    raw = entry if sort == "word" else f"{entry[0]}:{entry[1]}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def parse_cursor(sort, cursor):
+    """format_cursor 的反向；格式不符時 raise ValueError"""
+    padded = cursor + "=" * (-len(cursor) % 4)
+    cursor = base64.b64decode(padded, altchars=b"-_", validate=True).decode("utf-8")
+    if sort == "word":
+        return cursor
+    value, sep, word = cursor.partition(":")
+    if not sep:
+        raise ValueError(cursor)
+    return (int(value), word)
+
+
+class WordIndex:
+
+    def __init__(self, rows=()):
+        self._lock = threading.Lock()
+        self._rows = {row["word"]: dict(row) for row in rows}
+        self._sorted = {
+            field: sorted(_sort_entry(field, row) for row in self._rows.values())
+            for field in SORT_FIELDS
+        }
+
+    def __len__(self):
+        return len(self._rows)
+
+    # ----------------------------------------------------
+    # 異動
+    # ----------------------------------------------------
+    def _discard(self, field, entry):
+        keys = self._sorted[field]
+        i = bisect_left(keys, entry)
+        if i < len(keys) and keys[i] == entry:
+            del keys[i]
+
+    def put(self, row):
+        row = dict(row)
+        with self._lock:
+            old = self._rows.get(row["word"])
+            self._rows[row["word"]] = row
+            for field in SORT_FIELDS:
+                entry = _sort_entry(field, row)
+                if old is not None:
+                    old_entry = _sort_entry(field, old)
+                    if old_entry == entry:
+                        continue
+                    self._discard(field, old_entry)
+                insort(self._sorted[field], entry)
+
+    def remove(self, word):
+        with self._lock:
+            old = self._rows.pop(word, None)
+            if old is not None:
+                for field in SORT_FIELDS:
+                    self._discard(field, _sort_entry(field, old))
+
+    # ----------------------------------------------------
+    # 查詢
+    # ----------------------------------------------------
+    def query(self, sort="word", desc=False, limit=50, cursor=None, prefix=None, added_by=None, ranges=None):
+        """
+        sort    ：SORT_FIELDS 之一；desc 為 True 時由大到小
+        cursor  ：上一頁最後一筆的排序鍵（parse_cursor 的結果）
+        prefix  ：word 前綴
+        added_by：來源完全相符
+        ranges  ：{"count": (min, max), "reviewed": (min, max)}，min / max 為 None 表示不限
+
+        回傳 (rows, next_cursor)；next_cursor 為最後一筆的排序鍵，沒有下一頁時為 None
+        """
+        ranges = {f: r for f, r in (ranges or {}).items() if r != (None, None)}
+
+        def matches(row):
+            if prefix and not row["word"].startswith(prefix):
+                return False
+            if added_by is not None and (row.get("added_by") or "manual") != added_by:
+                return False
+            for field, (low, high) in ranges.items():
+                value = int(row.get(field) or 0)
+                if (low is not None and value < low) or (high is not None and value > high):
+                    return False
+            return True
+
+        with self._lock:
+            keys = self._sorted[sort]
+            lo, hi = 0, len(keys)
+            if sort == "word" and prefix:
+                lo, hi = bisect_left(keys, prefix), bisect_left(keys, _next_key(prefix))
+            elif sort in ranges:
+                low, high = ranges[sort]
+                if low is not None:
+                    lo = bisect_left(keys, (low,))
+                if high is not None:
+                    hi = bisect_left(keys, (high + 1,))
+
+            if sort != "word" and prefix:
+                words = self._sorted["word"]
+                p_lo, p_hi = bisect_left(words, prefix), bisect_left(words, _next_key(prefix))
+                if p_hi - p_lo < hi - lo:
+                    # 前綴範圍較小：取出後依排序鍵排序，改在這份 list 上分頁
+                    keys = sorted(_sort_entry(sort, self._rows[w]) for w in words[p_lo:p_hi])
+                    lo, hi = 0, len(keys)
+
+            if cursor is not None:
+                if desc:
+                    hi = min(hi, bisect_left(keys, cursor, lo, hi))
+                else:
+                    lo = max(lo, bisect_right(keys, cursor, lo, hi))
+
+            order = range(hi - 1, lo - 1, -1) if desc else range(lo, hi)
+            items, last = [], None
+            for i in order:
+                if len(items) >= limit:
+                    return items, last
+                entry = keys[i]
+                row = self._rows[entry if sort == "word" else entry[1]]
+                if matches(row):
+                    items.append(dict(row))
+                    last = entry
+            return items, None
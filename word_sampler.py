@@ -0,0 +1,168 @@
+# word_sampler.py
+"""
+/api/random 的加權抽樣
+
+每個單字的權重由 count、reviewed 與 seen 次數決定（常查、常出現、少複習的單字較常被抽到），
+以 Fenwick tree（binary indexed tree）保存權重前綴和：
+- 單字新增 / 更新 / 刪除、seen 計數增加時只更新該單字的權重，O(log n)
+- 每次抽樣 O(log n)，不需要讀檔或重建整份表
+- sample(n) 一次抽出 n 個不重複的單字（測驗出題用）
+"""
+import math
+import random
+import threading
+
+
+def word_weight(count=0, reviewed=0, seen=0):
+    """count / seen 取 log，避免極少數高頻單字壟斷抽樣；每多複習一次權重遞減"""
+    count, reviewed, seen = max(count or 0, 0), max(reviewed or 0, 0), max(seen or 0, 0)
+    return (1 + math.log1p(count) + math.log1p(seen)) / (1 + reviewed)
+
+
+class FenwickTree:
+    """浮點權重的 Fenwick tree，索引從 0 開始"""
+
+    def __init__(self, weights):
+        n = len(weights)
+        tree = [0.0] * (n + 1)
+        for i, w in enumerate(weights, 1):
+            tree[i] += w
+            j = i + (i & -i)
+            if j <= n:
+                tree[j] += tree[i]
+        self._tree = tree
+        self._size = n
+        self._top = 1 << (n.bit_length() - 1) if n else 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, i, delta):
+        i += 1
+        while i <= self._size:
+            self._tree[i] += delta
+            i += i & -i
+
+    def total(self):
+        i, s = self._size, 0.0
+        while i > 0:
+            s += self._tree[i]
+            i -= i & -i
+        return s
+
+    def find(self, target):
+        """前綴和首次超過 target 的索引"""
+        pos, step = 0, self._top
+        while step:
+            nxt = pos + step
+            if nxt <= self._size and self._tree[nxt] <= target:
+                pos = nxt
+                target -= self._tree[nxt]
+            step >>= 1
+        return min(pos, self._size - 1)
+
+
+class WeightedSampler:
+
+    def __init__(self, rows=(), seen=None, rng=None):
+        self._lock = threading.Lock()
+        self._rng = rng or random.Random()
+        self._rows = []        # slot -> row（已刪除為 None）
+        self._weights = []     # slot -> 權重
+        self._seen = []        # slot -> seen 次數
+        self._slots = {}       # word -> slot
+        self._free = []
+
+        seen = seen or {}
+        for row in rows:
+            word = row["word"]
+            self._slots[word] = len(self._rows)
+            self._rows.append(row)
+            self._seen.append(seen.get(word, 0))
+            self._weights.append(self._weight(row, self._seen[-1]))
+        self._tree = FenwickTree(self._weights)
+
+    @staticmethod
+    def _weight(row, seen):
+        return word_weight(row.get("count", 0), row.get("reviewed", 0), seen)
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __contains__(self, word):
+        return word in self._slots
+
+    def _set_weight(self, slot, weight):
+        self._tree.add(slot, weight - self._weights[slot])
+        self._weights[slot] = weight
+
+    def _grow(self):
+        """slot 用盡時容量加倍並以 O(n) 重建 tree"""
+        extra = max(len(self._rows), 16)
+        self._free.extend(range(len(self._rows) + extra - 1, len(self._rows) - 1, -1))
+        self._rows.extend([None] * extra)
+        self._weights.extend([0.0] * extra)
+        self._seen.extend([0] * extra)
+        self._tree = FenwickTree(self._weights)
+
+    # ----------------------------------------------------
+    # 增量更新
+    # ----------------------------------------------------
+    def put(self, row, seen=None):
+        """新增或更新一個單字（row 至少含 word，count / reviewed 可省略）"""
+        word = row["word"]
+        with self._lock:
+            slot = self._slots.get(word)
+            if slot is None:
+                if not self._free:
+                    self._grow()
+                slot = self._free.pop()
+                self._slots[word] = slot
+                self._seen[slot] = 0
+            if seen is not None:
+                self._seen[slot] = seen
+            self._rows[slot] = dict(row)
+            self._set_weight(slot, self._weight(row, self._seen[slot]))
+
+    def remove(self, word):
+        with self._lock:
+            slot = self._slots.pop(word, None)
+            if slot is None:
+                return
+            self._set_weight(slot, 0.0)
+            self._rows[slot] = None
+            self._free.append(slot)
+
+    def add_seen(self, counts):
+        """seen 計數增加（{word: 增量}），只更新字彙庫內的單字"""
+        with self._lock:
+            for word, n in counts.items():
+                slot = self._slots.get(word)
+                if slot is None:
+                    continue
+                self._seen[slot] += n
+                self._set_weight(slot, self._weight(self._rows[slot], self._seen[slot]))
+
+    # ----------------------------------------------------
+    # 抽樣
+    # ----------------------------------------------------
+    def sample(self, n=1):
+        """依權重抽出最多 n 個不重複的單字（回傳 row 的複本）"""
+        picked = []
+        with self._lock:
+            n = min(n, len(self._slots))
+            try:
+                while len(picked) < n:
+                    total = self._tree.total()
+                    if total <= 1e-9:
+                        break
+                    slot = self._tree.find(self._rng.random() * total)
+                    weight = self._weights[slot]
+                    if weight <= 0:
+                        continue  # 浮點誤差落在空 slot，重抽
+                    picked.append((slot, weight))
+                    self._set_weight(slot, 0.0)   # 暫時移出，確保不重複
+            finally:
+                for slot, weight in picked:
+                    self._set_weight(slot, weight)
+            return [dict(self._rows[slot]) for slot, _ in picked]
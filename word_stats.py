@@ -0,0 +1,83 @@
+# word_stats.py
+"""
+/api/words/stats 的累計統計
+
+以每個單字的 (count, reviewed, added_by, 新增日期) 維護總計與分布，
+單字新增 / 更新 / 刪除時只扣掉舊值、加上新值，查詢時不需要掃描整份字彙庫。
+"""
+import threading
+import time
+from collections import Counter
+
+UNKNOWN_DAY = "unknown"   # 舊資料沒有 added_at
+
+
+def _day(added_at):
+    if not added_at:
+        return UNKNOWN_DAY
+    return time.strftime("%Y-%m-%d", time.localtime(added_at))
+
+
+def _key(row):
+    return (
+        int(row.get("count") or 0),
+        int(row.get("reviewed") or 0),
+        row.get("added_by") or "manual",
+        _day(row.get("added_at")),
+    )
+
+
+class WordStats:
+
+    def __init__(self, rows=()):
+        self._lock = threading.Lock()
+        self._keys = {}                 # word -> _key(row)
+        self.total_count = 0
+        self.reviewed = Counter()       # reviewed 次數 -> 單字數
+        self.added_by = Counter()
+        self.added_per_day = Counter()
+        for row in rows:
+            self._apply(row["word"], _key(row))
+
+    def _apply(self, word, key):
+        old = self._keys.pop(word, None)
+        if old is not None:
+            self._account(old, -1)
+        if key is not None:
+            self._keys[word] = key
+            self._account(key, 1)
+
+    def _account(self, key, sign):
+        count, reviewed, added_by, day = key
+        self.total_count += sign * count
+        for counter, k in ((self.reviewed, reviewed), (self.added_by, added_by), (self.added_per_day, day)):
+            counter[k] += sign
+            if counter[k] <= 0:
+                del counter[k]
+
+    def put(self, row):
+        with self._lock:
+            self._apply(row["word"], _key(row))
+
+    def remove(self, word):
+        with self._lock:
+            self._apply(word, None)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def snapshot(self, days=None):
+        """days 指定時 added_per_day 只回傳最近 N 個有新增紀錄的日期"""
+        with self._lock:
+            total = len(self._keys)
+            per_day = sorted(self.added_per_day.items(), key=lambda kv: (kv[0] != UNKNOWN_DAY, kv[0]))
+            if days is not None:
+                per_day = per_day[-days:] if days > 0 else []
+            return {
+                "total_words": total,
+                "total_count": self.total_count,
+                "avg_count": round(self.total_count / total, 2) if total else 0,
+                "reviewed_distribution": {str(k): v for k, v in sorted(self.reviewed.items())},
+                "added_by": dict(self.added_by.most_common()),
+                "added_per_day": dict(per_day),
+            }
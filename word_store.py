@@ -0,0 +1,537 @@
+# word_store.py
+"""
+字彙庫儲存後端
+
+- SqliteWordStore：words.db（WAL），以 word 為主鍵，單筆 upsert / delete / review
+- JsonWordStore  ：舊版格式，整份寫回 words.json（單一 writer thread 合併同時到達的寫入）
+
+words.json 仍作為匯入 / 匯出格式；第一次建立 words.db 時會自動匯入既有的 words.json。
+每次寫入後透過 cache.user_cache_put / user_cache_remove 逐筆同步 _USER_CACHE，
+並 bump 共用版本號；其他 worker 以 changes_since() 只讀取新增的異動。
+"""
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import cache
+import generation
+import srs
+from group_commit import GroupCommitWriter, Unchanged
+
+WORD_FIELDS = ("word", "definition", "reviewed", "count", "added_by", "added_at")
+INT_FIELDS = ("reviewed", "count", "added_at")
+
+
+def _to_int(value, default=0):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def normalize_item(item):
+    """匯入資料只保留已知欄位，數值欄位轉為 int（CSV 讀進來皆為字串）"""
+    row = {k: item[k] for k in item if k in WORD_FIELDS}
+    row["word"] = str(row["word"]).strip()
+    for k in INT_FIELDS:
+        if k in row:
+            row[k] = _to_int(row[k])
+    if not row.get("added_at"):
+        row.pop("added_at", None)   # 空值交由寫入端填入匯入時間
+    return row
+
+
+def write_words_file(words: list):
+    """以統一方式寫回 word list（json 後端與匯出使用）；暫存檔 + rename，中斷時不會留下殘缺的檔案"""
+    cache.write_json_atomic(cache.WORDS_FILE, words, indent=2)
+
+class WordStore:
+    """儲存後端介面，api_words / api_import_export 只透過這組方法存取字彙"""
+
+    def list_words(self):
+        raise NotImplementedError
+
+    def iter_words(self, batch_size=500):
+        yield from self.list_words()
+
+    def get_word(self, word):
+        raise NotImplementedError
+
+    def count_words(self):
+        raise NotImplementedError
+
+    def add_word(self, word, definition="", added_by="manual", count=1):
+        """已存在 → count 累加、definition 有值才覆寫；不存在 → 新增。回傳 (status, row)"""
+        raise NotImplementedError
+
+    def add_words(self, entries):
+        """
+        add_word 的批次版本，整批只 commit 一次；entries 為 {word, definition, added_by, count}，
+        同一批中重複的單字依序累加。回傳 (added, updated)
+        """
+        raise NotImplementedError
+
+    def merge_words(self, items):
+        """匯入語意：已存在者以 item 欄位覆寫，不存在者新增。回傳 (added, updated)"""
+        raise NotImplementedError
+
+    def delete_word(self, word):
+        raise NotImplementedError
+
+    def review_word(self, word, remembered, quality=None):
+        """remembered 為真時 reviewed +1，並依 quality（0–5）更新複習排程；
+        回傳更新後的 row（含排程欄位）；找不到回傳 None"""
+        raise NotImplementedError
+
+    def due_words(self, now, limit=20):
+        """到期（due_at <= now）的單字，依到期時間排序"""
+        raise NotImplementedError
+
+    def change_cursor(self):
+        """目前的異動序號（整份載入前先取得）"""
+        return 0
+
+    def changes_since(self, cursor):
+        """回傳 (新序號, {word: row 或 None（已刪除）})；無法增量同步時回傳 None"""
+        return None
+
+
+# ============================================================
+# SQLite 後端
+# ============================================================
+class SqliteWordStore(WordStore):
+    SCHEMA_VERSION = 5
+    CHANGELOG_KEEP = 10000   # 保留最近 N 筆異動供其他 worker 增量同步
+
+    def __init__(self, path, import_from=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._init_schema(import_from)
+
+    @contextmanager
+    def _transaction(self):
+        """取得 process 內的連線鎖並開啟 IMMEDIATE 交易（同時排除其他 process 的寫入）；
+        交易沒有修改任何資料列時（例如單字不存在）不遞增版本號，避免其他 worker 與回應快取無謂失效"""
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            changed = self._conn.total_changes != before
+        if changed:
+            cache.bump_generation(generation.WORDS)
+
+    def _log_changes(self, words):
+        self._conn.executemany("INSERT INTO changes (word) VALUES (?)", [(w,) for w in words])
+        self._conn.execute(
+            "DELETE FROM changes WHERE seq <= (SELECT MAX(seq) FROM changes) - ?",
+            (self.CHANGELOG_KEEP,),
+        )
+
+    def _init_schema(self, import_from):
+        with self._transaction() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS words (
+                    word       TEXT PRIMARY KEY,
+                    definition TEXT NOT NULL DEFAULT '',
+                    reviewed   INTEGER NOT NULL DEFAULT 0,
+                    count      INTEGER NOT NULL DEFAULT 0,
+                    added_by   TEXT NOT NULL DEFAULT 'manual',
+                    added_at   INTEGER
+                ) WITHOUT ROWID
+            """)
+            columns = {r["name"] for r in conn.execute("PRAGMA table_info(words)")}
+            if "added_at" not in columns:
+                # v4：新增時間（舊資料為 NULL，統計時歸入 unknown）
+                conn.execute("ALTER TABLE words ADD COLUMN added_at INTEGER")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS schedule (
+                    word     TEXT PRIMARY KEY,
+                    ease     REAL NOT NULL,
+                    interval REAL NOT NULL,
+                    reps     INTEGER NOT NULL,
+                    due_at   REAL NOT NULL
+                ) WITHOUT ROWID
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS schedule_due_at ON schedule (due_at)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS changes (
+                    seq  INTEGER PRIMARY KEY AUTOINCREMENT,
+                    word TEXT NOT NULL
+                )
+            """)
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version == 0:
+                # 第一次建立：匯入既有 words.json
+                if import_from and os.path.exists(import_from):
+                    raw = cache.load_json_file(import_from) or []
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO words VALUES (?, ?, ?, ?, ?, ?)",
+                        [self._params(normalize_item(w)) for w in raw if w.get("word")],
+                    )
+                    print(f"[WordStore] Imported {len(raw):,} words from {import_from}")
+            if version < 3:
+                # 既有單字依 reviewed / count 建立初始排程
+                missing = conn.execute(
+                    "SELECT word, reviewed, count FROM words "
+                    "WHERE word NOT IN (SELECT word FROM schedule)"
+                ).fetchall()
+                for r in missing:
+                    self._init_schedule(r["word"], r["reviewed"], r["count"])
+            if version < 5:
+                # v5：舊版推估的初始間隔沒有上限（reviewed 很大時為 inf），依新上限重新推估
+                oversized = conn.execute(
+                    "SELECT s.word, w.reviewed, w.count FROM schedule s JOIN words w ON w.word = s.word "
+                    "WHERE s.interval > ?", (srs.MAX_INITIAL_INTERVAL,)
+                ).fetchall()
+                for r in oversized:
+                    conn.execute("DELETE FROM schedule WHERE word = ?", (r["word"],))
+                    self._init_schedule(r["word"], r["reviewed"], r["count"])
+            if version < self.SCHEMA_VERSION:
+                conn.execute(f"PRAGMA user_version={self.SCHEMA_VERSION}")
+
+    def _init_schedule(self, word, reviewed=0, count=0):
+        state = srs.initial_schedule(reviewed, count)
+        self._conn.execute(
+            "INSERT OR IGNORE INTO schedule (word, ease, interval, reps, due_at) VALUES (?, ?, ?, ?, ?)",
+            (word, state["ease"], state["interval"], state["reps"], state["due_at"]),
+        )
+
+    @staticmethod
+    def _params(row):
+        return (
+            row["word"],
+            row.get("definition") or "",
+            _to_int(row.get("reviewed")),
+            _to_int(row.get("count")),
+            row.get("added_by") or "manual",
+            row.get("added_at") or None,
+        )
+
+    @staticmethod
+    def _row(r):
+        # added_at 為 NULL（v4 之前的資料）時不輸出
+        return {k: r[k] for k in WORD_FIELDS if r[k] is not None} if r is not None else None
+
+    def _get(self, word):
+        return self._row(self._conn.execute(
+            "SELECT * FROM words WHERE word = ?", (word,)).fetchone())
+
+    # ----------------------------------------------------
+    # 讀取
+    # ----------------------------------------------------
+    def list_words(self):
+        with self._lock:
+            return [self._row(r) for r in self._conn.execute("SELECT * FROM words")]
+
+    def iter_words(self, batch_size=500):
+        """以 keyset 分批讀取，匯出時不需一次載入整份字彙庫"""
+        last = ""
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT * FROM words WHERE word > ? ORDER BY word LIMIT ?",
+                    (last, batch_size),
+                ).fetchall()
+            if not rows:
+                return
+            for r in rows:
+                yield self._row(r)
+            last = rows[-1]["word"]
+
+    def get_word(self, word):
+        with self._lock:
+            return self._get(word)
+
+    def count_words(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM words").fetchone()[0]
+
+    # ----------------------------------------------------
+    # 寫入
+    # ----------------------------------------------------
+    def _add_locked(self, word, definition, added_by, count, now):
+        """回傳 (原本是否存在, 寫入後的 row)；需在 _transaction 內呼叫"""
+        existed = self._get(word) is not None
+        self._conn.execute(
+            """
+            INSERT INTO words (word, definition, reviewed, count, added_by, added_at)
+            VALUES (?, ?, 0, ?, ?, ?)
+            ON CONFLICT(word) DO UPDATE SET
+                count = count + excluded.count,
+                definition = CASE WHEN excluded.definition != ''
+                                  THEN excluded.definition ELSE definition END
+            """,
+            (word, definition or "", count, added_by or "manual", now),
+        )
+        if not existed:
+            self._init_schedule(word, 0, count)
+        return existed, self._get(word)
+
+    def add_word(self, word, definition="", added_by="manual", count=1):
+        with self._transaction():
+            existed, row = self._add_locked(word, definition, added_by, count, int(time.time()))
+            self._log_changes([word])
+        cache.user_cache_put(row["word"], row["definition"], row)
+        return ("updated" if existed else "created"), row
+
+    def add_words(self, entries):
+        if not entries:
+            return 0, 0
+        added = updated = 0
+        rows = {}
+        now = int(time.time())
+        with self._transaction():
+            for e in entries:
+                existed, rows[e["word"]] = self._add_locked(
+                    e["word"], e.get("definition"), e.get("added_by"), e.get("count", 1), now)
+                if existed:
+                    updated += 1
+                else:
+                    added += 1
+            self._log_changes(list(rows))
+        for word, row in rows.items():
+            cache.user_cache_put(word, row["definition"], row)
+        return added, updated
+
+    def merge_words(self, items):
+        added = updated = 0
+        rows = []
+        now = int(time.time())
+        with self._transaction() as conn:
+            for item in items:
+                row = self._get(item["word"])
+                if row:
+                    row.update(item)
+                    updated += 1
+                else:
+                    row = {"added_at": now, **item}
+                    added += 1
+                    self._init_schedule(row["word"], row.get("reviewed"), row.get("count"))
+                conn.execute("INSERT OR REPLACE INTO words VALUES (?, ?, ?, ?, ?, ?)", self._params(row))
+                rows.append(row)
+            self._log_changes([row["word"] for row in rows])
+        for row in rows:
+            cache.user_cache_put(row["word"], row.get("definition", ""), row)
+        return added, updated
+
+    def delete_word(self, word):
+        with self._transaction() as conn:
+            deleted = conn.execute("DELETE FROM words WHERE word = ?", (word,)).rowcount
+            conn.execute("DELETE FROM schedule WHERE word = ?", (word,))
+            if deleted:
+                self._log_changes([word])
+        cache.user_cache_remove(word)
+        return deleted > 0
+
+    def review_word(self, word, remembered, quality=None):
+        if quality is None:
+            quality = srs.QUALITY_REMEMBERED if remembered else srs.QUALITY_FORGOTTEN
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE words SET reviewed = reviewed + ? WHERE word = ?",
+                (1 if remembered else 0, word),
+            )
+            row = self._get(word)
+            if row is None:
+                return None
+            self._log_changes([word])
+
+            self._init_schedule(word, row["reviewed"], row["count"])
+            state = dict(conn.execute(
+                "SELECT ease, interval, reps, due_at FROM schedule WHERE word = ?", (word,)
+            ).fetchone())
+            state = srs.next_schedule(state, quality)
+            conn.execute(
+                "UPDATE schedule SET ease = ?, interval = ?, reps = ?, due_at = ? WHERE word = ?",
+                (state["ease"], state["interval"], state["reps"], state["due_at"], word),
+            )
+        cache.user_cache_put(word, row["definition"], row)
+        return {**row, **state}
+
+    def due_words(self, now, limit=20):
+        """走 schedule_due_at 索引，只讀取前 limit 筆"""
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT w.*, s.ease, s.interval, s.reps, s.due_at
+                FROM schedule s JOIN words w ON w.word = s.word
+                WHERE s.due_at <= ?
+                ORDER BY s.due_at
+                LIMIT ?
+                """,
+                (now, limit),
+            ).fetchall()
+        return [
+            {**self._row(r), "ease": r["ease"], "interval": r["interval"],
+             "reps": r["reps"], "due_at": r["due_at"]}
+            for r in rows
+        ]
+
+    # ----------------------------------------------------
+    # 跨 worker 增量同步
+    # ----------------------------------------------------
+    def change_cursor(self):
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+
+    def changes_since(self, cursor):
+        with self._lock:
+            low, high = self._conn.execute(
+                "SELECT MIN(seq), COALESCE(MAX(seq), 0) FROM changes").fetchone()
+            if low is not None and cursor < low - 1:
+                return None  # 異動紀錄已被清除，改為整份重載
+            rows = self._conn.execute(
+                """
+                SELECT c.word AS changed, w.*
+                FROM (SELECT DISTINCT word FROM changes WHERE seq > ? AND seq <= ?) c
+                LEFT JOIN words w ON w.word = c.word
+                """,
+                (cursor, high),
+            ).fetchall()
+        return high, {r["changed"]: (self._row(r) if r["word"] is not None else None) for r in rows}
+
+
+# ============================================================
+# JSON 後端（舊版 words.json 整檔覆寫）
+# ============================================================
+class JsonWordStore(WordStore):
+    """所有寫入都經由單一 writer thread，同時到達的異動合併成一次 words.json 寫回"""
+
+    def __init__(self, path):
+        self.path = path
+        self._writer = GroupCommitWriter(
+            self._load_state, self._save_state, lock_path=f"{path}.lock", name="words-json-writer",
+        )
+
+    def _load(self):
+        return cache.load_json_file(self.path) or []
+
+    def _load_state(self):
+        # writer 內部以 word -> row 操作，寫回時保留原本的順序
+        return {w["word"]: w for w in self._load()}
+
+    def _save_state(self, state):
+        write_words_file(list(state.values()))
+        cache.bump_generation(generation.WORDS)
+
+    def list_words(self):
+        return self._load()
+
+    def get_word(self, word):
+        return next((w for w in self._load() if w["word"] == word), None)
+
+    def count_words(self):
+        return len(self._load())
+
+    @staticmethod
+    def _add_to_state(state, word, definition, added_by, count, now):
+        """回傳 (原本是否存在, row)"""
+        existing = state.get(word)
+        if existing:
+            if definition:
+                existing["definition"] = definition
+            existing["count"] = existing.get("count", 0) + count
+            return True, existing
+        row = state[word] = {
+            "word": word,
+            "definition": definition or "",
+            "reviewed": 0,
+            "count": count,
+            "added_by": added_by or "manual",
+            "added_at": now,
+        }
+        return False, row
+
+    def add_word(self, word, definition="", added_by="manual", count=1):
+        def mutate(state):
+            existed, row = self._add_to_state(state, word, definition, added_by, count, int(time.time()))
+            return ("updated" if existed else "created"), dict(row)
+
+        status, row = self._writer.apply(mutate)
+        cache.user_cache_put(row["word"], row.get("definition", ""), row)
+        return status, row
+
+    def add_words(self, entries):
+        def mutate(state):
+            added = updated = 0
+            rows = {}
+            now = int(time.time())
+            for e in entries:
+                existed, row = self._add_to_state(
+                    state, e["word"], e.get("definition"), e.get("added_by"), e.get("count", 1), now)
+                rows[e["word"]] = row
+                if existed:
+                    updated += 1
+                else:
+                    added += 1
+            if not rows:
+                return Unchanged((0, 0, {}))
+            return added, updated, {word: dict(row) for word, row in rows.items()}
+
+        added, updated, rows = self._writer.apply(mutate)
+        for word, row in rows.items():
+            cache.user_cache_put(word, row.get("definition", ""), row)
+        return added, updated
+
+    def merge_words(self, items):
+        now = int(time.time())
+
+        def mutate(state):
+            added = updated = 0
+            for item in items:
+                if item["word"] in state:
+                    state[item["word"]].update(item)
+                    updated += 1
+                else:
+                    state[item["word"]] = {"added_at": now, **item}
+                    added += 1
+            return added, updated, {item["word"]: dict(state[item["word"]]) for item in items}
+
+        added, updated, rows = self._writer.apply(mutate)
+        for word, row in rows.items():
+            cache.user_cache_put(word, row.get("definition", ""), row)
+        return added, updated
+
+    def delete_word(self, word):
+        def mutate(state):
+            if state.pop(word, None) is None:
+                return Unchanged(False)
+            return True
+
+        deleted = self._writer.apply(mutate)
+        cache.user_cache_remove(word)
+        return deleted
+
+    def review_word(self, word, remembered, quality=None):
+        # json 後端不保存複習排程，只更新 reviewed
+        def mutate(state):
+            w = state.get(word)
+            if w is None:
+                return Unchanged(None)
+            if not remembered:
+                return Unchanged(dict(w))
+            w["reviewed"] = w.get("reviewed", 0) + 1
+            return dict(w)
+
+        row = self._writer.apply(mutate)
+        if row is not None:
+            cache.user_cache_put(word, row.get("definition", ""), row)
+        return row
+
+
+def open_word_store(backend="sqlite"):
+    if backend == "json":
+        return JsonWordStore(cache.WORDS_FILE)
+    return SqliteWordStore(cache.WORDS_DB_FILE, import_from=cache.WORDS_FILE)